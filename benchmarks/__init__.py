@@ -0,0 +1 @@
+"""Reproducible benchmarks for the creative pipeline (python -m benchmarks.run)."""
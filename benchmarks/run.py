@@ -0,0 +1,355 @@
+"""
+Benchmarks for the creative pipeline hot paths.
+
+    python -m benchmarks.run                      # run and compare against baseline.json
+    python -m benchmarks.run --update-baseline    # record a new baseline
+    python -m benchmarks.run --stages compose encode_jpeg --repeat 50 --runs 5
+
+Every case runs --runs times, each in a fresh child process on
+deterministic synthetic packshots, so caches start cold and the peak memory
+of one case is not hidden by another. Per run we record latency (fastest,
+p50 and p95 of --repeat timed iterations after a warm-up), throughput and
+the peak RSS added by the stage from the first call on, warm-up included
+(VmHWM after resetting it through /proc/self/clear_refs on Linux,
+ru_maxrss growth elsewhere). A case reports the fastest iteration over all
+runs, the median of the per-run p50/p95/throughput and the smallest peak.
+
+Stages, measured for each of the four output formats:
+
+* decode       - upload bytes to the fitted product variant (draft decode)
+* thumbnail    - LANCZOS fit of a decoded product into the product box
+* text         - layout plus rasterizing every text block
+* compose      - full creative render with caches cleared
+* encode_jpeg  - JPEG q85 with Huffman optimization
+* encode_png   - PNG, default compression
+* compliance   - check_creative on the rendered canvas
+
+decode and thumbnail are also run for every product size. Results are
+compared with the stored baseline, recorded the same way: a fastest
+iteration slower than --tolerance, or a peak memory above
+--memory-tolerance, fails the run with exit code 1. The gate uses the
+fastest iteration because on a shared or single-core machine scheduler
+noise only ever adds time, so the minimum moves with the code and the
+median moves with the neighbours.
+Baselines are machine specific; record one on the machine that runs the
+comparison.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Stages measure the work itself, not reads from guardian.disk_cache
+os.environ["GUARDIAN_CACHE_DIR"] = ""
+
+PRODUCT_SIZES = ((800, 600), (2000, 1500), (4000, 3000))
+DEFAULT_PRODUCT_SIZE = (2000, 1500)
+STAGES = ("decode", "thumbnail", "text", "compose", "encode_jpeg", "encode_png", "compliance")
+# Stages whose cost depends on the product resolution
+SIZED_STAGES = ("decode", "thumbnail")
+
+COPY = {
+    "headline": "SUMMER SALE - 50% OFF",
+    "subhead": "Clubcard members save even more",
+    "value_tile": "Clubcard Price",
+    "tag": "Available at Tesco",
+    "background": "#FFF3E0",
+}
+
+
+# ==================== SYNTHETIC INPUTS ====================
+
+def synthetic_product(size, seed=0):
+    """A packshot-like image: white backdrop, shaded product shape, label and texture."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    box = (width * 0.25, height * 0.1, width * 0.75, height * 0.9)
+    draw.rounded_rectangle(box, radius=int(width * 0.05), fill=(40, 120, 60))
+    draw.rectangle((width * 0.3, height * 0.4, width * 0.7, height * 0.6), fill=(230, 200, 40))
+    draw.ellipse((width * 0.4, height * 0.15, width * 0.6, height * 0.3), fill=(200, 40, 30))
+
+    # Sensor-like noise and soft edges so encoders see photographic content
+    pixels = np.asarray(image, dtype=np.int16)
+    pixels = pixels + rng.normal(0, 6, pixels.shape).astype(np.int16)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+    return image.filter(ImageFilter.GaussianBlur(1))
+
+
+def product_jpeg(size):
+    buffer = io.BytesIO()
+    synthetic_product(size).save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+# ==================== MEMORY ====================
+
+def _release_free_memory():
+    """Return freed heap to the OS (glibc) so setup garbage does not absorb the stage's peak."""
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _reset_peak():
+    """Reset the kernel's peak RSS mark; returns False where unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes(reset_ok):
+    if reset_ok:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return _peak_rss_bytes(False)
+
+
+# ==================== CASES ====================
+
+def _prepare(stage, label, product_size):
+    """Build inputs outside the timed region; returns a zero-argument callable."""
+    from guardian.assets import ProductAsset, _proxies, asset_cache
+    from guardian.compliance import check_creative
+    from guardian.render import (
+        CreativeSpec, TEXT_COLOURS, _layers, clear_render_cache, layout_for, render_creative, text_layer,
+    )
+
+    if stage == "decode":
+        data = product_jpeg(product_size)
+        probe = CreativeSpec(product=ProductAsset.from_bytes(data), format=label, **COPY)
+        box = layout_for(probe).frame.product
+
+        def run():
+            asset_cache.clear()
+            _proxies.clear()
+            ProductAsset.from_bytes(data).fit(box.width, box.height)
+        return run
+
+    image = synthetic_product(product_size)
+    digest = f"bench-{product_size[0]}x{product_size[1]}"
+    spec = CreativeSpec(product=ProductAsset.from_image(image, digest), format=label, **COPY)
+    layout = layout_for(spec)
+
+    if stage == "thumbnail":
+        box = layout.frame.product
+
+        def run():
+            # A fresh handle has empty variant and pyramid caches
+            ProductAsset.from_image(image, digest).fit(box.width, box.height)
+        return run
+
+    if stage == "text":
+        def run():
+            _layers.clear()
+            text_layout = layout_for(spec)
+            for slot, block in text_layout.blocks.items():
+                text_layer(block, text_layout.family, TEXT_COLOURS[slot])
+        return run
+
+    if stage == "compose":
+        def run():
+            clear_render_cache()
+            render_creative(spec, use_cache=False)
+        return run
+
+    canvas = render_creative(spec)
+    if stage == "encode_jpeg":
+        return lambda: canvas.save(io.BytesIO(), format="JPEG", quality=85, optimize=True)
+    if stage == "encode_png":
+        return lambda: canvas.save(io.BytesIO(), format="PNG")
+    if stage == "compliance":
+        return lambda: check_creative(spec, canvas)
+    raise ValueError(f"Unknown stage '{stage}'")
+
+
+def run_case(stage, label, product_size, repeat, warmup=2):
+    """Measure one case; runs in its own child process."""
+    run = _prepare(stage, label, tuple(product_size))
+    _release_free_memory()
+    baseline_rss = _current_rss_bytes()
+    reset_ok = _reset_peak()
+    for _ in range(warmup):
+        run()
+
+    timings = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    peak = _peak_rss_bytes(reset_ok)
+
+    timings.sort()
+    return {
+        "min_ms": round(timings[0] * 1000, 3),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(timings[min(int(0.95 * len(timings)), len(timings) - 1)] * 1000, 3),
+        "ops_per_s": round(repeat / total, 2),
+        "peak_mb": round(max(peak - baseline_rss, 0) / 2**20, 2),
+    }
+
+
+def cases(stages):
+    from guardian.render import FORMATS, format_slug
+
+    for stage in stages:
+        sizes = PRODUCT_SIZES if stage in SIZED_STAGES else (DEFAULT_PRODUCT_SIZE,)
+        for label in FORMATS:
+            for size in sizes:
+                key = f"{stage}/{format_slug(label)}"
+                if stage in SIZED_STAGES:
+                    key += f"/{size[0]}x{size[1]}"
+                yield key, stage, label, size
+
+
+# ==================== BASELINE ====================
+
+def compare(results, baseline, tolerance, memory_tolerance, slack_ms=1.0, memory_slack_mb=2.0):
+    """
+    (key, message) for every result that is slower or larger than the baseline.
+
+    Latency is compared on the fastest iteration (min_ms). The absolute
+    slacks keep sub-millisecond cases and allocator noise from tripping the
+    relative tolerances.
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or "min_ms" not in base:
+            continue
+        if result["min_ms"] > base["min_ms"] * (1 + tolerance) + slack_ms:
+            regressions.append((key, f"fastest {result['min_ms']:.2f}ms vs baseline {base['min_ms']:.2f}ms"))
+        if result["peak_mb"] > base["peak_mb"] * (1 + memory_tolerance) + memory_slack_mb:
+            regressions.append((key, f"peak {result['peak_mb']:.1f}MB vs baseline {base['peak_mb']:.1f}MB"))
+    return regressions
+
+
+def machine_info():
+    import PIL
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def measure(case, repeat, runs=1):
+    """Run one case runs times, each in a short-lived process: cold caches and an isolated peak RSS."""
+    key, stage, label, size = case
+    measured = []
+    for _ in range(runs):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            measured.append(pool.submit(run_case, stage, label, size, repeat).result())
+    return {
+        "min_ms": min(m["min_ms"] for m in measured),
+        "p50_ms": statistics.median(m["p50_ms"] for m in measured),
+        "p95_ms": statistics.median(m["p95_ms"] for m in measured),
+        "ops_per_s": statistics.median(m["ops_per_s"] for m in measured),
+        "peak_mb": min(m["peak_mb"] for m in measured),
+    }
+
+
+def print_result(key, result):
+    print(f"{key:<44} {result['min_ms']:>9.2f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+          f"{result['ops_per_s']:>9.1f} {result['peak_mb']:>8.1f}")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the creative pipeline hot paths")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=30, help="timed iterations per run")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per case")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown of the fastest iteration (0.25 = 25%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="allowed peak memory growth")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    all_cases = {case[0]: case for case in cases(args.stages)}
+    print(f"{'case':<44} {'min ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9} {'peak MB':>8}")
+    for key, case in all_cases.items():
+        results[key] = measure(case, args.repeat, args.runs)
+        print_result(key, results[key])
+
+    report = {"machine": machine_info(), "repeat": args.repeat, "runs": args.runs, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != report["machine"]:
+        print("Note: baseline was recorded on a different machine or library versions")
+
+    regressions = compare(results, baseline["results"], args.tolerance, args.memory_tolerance)
+    if regressions:
+        # Confirm before failing: a second run of the flagged cases filters out scheduler noise
+        print(f"\nRe-running {len({key for key, _ in regressions})} flagged case(s)")
+        for key in sorted({key for key, _ in regressions}):
+            retry = measure(all_cases[key], args.repeat, args.runs)
+            print_result(key, retry)
+            results[key] = {field: min(results[key][field], retry[field])
+                            for field in ("min_ms", "p50_ms", "p95_ms", "peak_mb")}
+            results[key]["ops_per_s"] = max(results[key].get("ops_per_s", 0), retry["ops_per_s"])
+        regressions = compare(results, baseline["results"], args.tolerance, args.memory_tolerance)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+        for key, message in regressions:
+            print(f"  REGRESSION {key}: {message}")
+        return 1
+    print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
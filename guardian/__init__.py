@@ -0,0 +1,3 @@
+"""
+Guideline Guardian AI - headless creative pipeline used by app.py
+"""
@@ -0,0 +1,489 @@
+"""
+Headless HTTP render API.
+
+    python -m guardian.api --port 8502 --workers 4
+
+Runs the same render, encoding and compliance code as the Streamlit UI
+behind a plain HTTP/1.1 server from the standard library:
+
+    POST /render         one creative: JSON in, encoded creative + report out
+    POST /render/batch   many creatives in one request (shared product image)
+    POST /compliance     compliance report only
+    POST /export/pack    ZIP of every format as JPEG and PNG plus compliance.json
+    GET  /health
+    GET  /metrics        Prometheus text format (per worker process)
+
+A render request is a JSON object with the copy fields of a CreativeSpec
+(headline, subhead, value_tile, tag and background as strings, missing or
+null for the defaults; remove_background as a boolean), a ``format``
+(FORMATS label or slug such as "instagram-story"), the product as base64
+in ``image`` and optionally ``image_format`` (JPEG/PNG), ``quality`` and
+``max_kb`` (the JPEG budget, also used by the File Size check). The
+response carries the creative as base64 plus the compliance report; send
+``Accept: image/jpeg`` (or image/png) to /render to get the raw file
+instead, with the score in X-Compliance-* headers. /export/pack takes the
+same fields (``format`` is replaced by an optional ``formats`` list, plus
+``image_formats`` and ``name``) and streams the archive with chunked
+transfer encoding while it is being built.
+
+Connections are kept alive (HTTP/1.1, every response has a Content-Length
+or is chunked) and each worker process serves them on a bounded thread pool
+(GUARDIAN_API_THREADS); further connections wait in the pool's queue, and
+idle keep-alive connections are closed after KEEPALIVE_SECONDS. Workers are
+pre-forked and share one listening socket, so renders scale across cores
+while every worker keeps its own warm asset, layer, render and export
+caches; decodes, masks, layers and exports are shared between workers (and
+restarts) through guardian.disk_cache. Repeated product images are decoded
+once per worker at most (content hash).
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from guardian.assets import ProductAsset, bytes_digest
+from guardian.cache import LRUCache
+from guardian.compliance import MAX_FILE_BYTES, check_creative
+from guardian.encoding import export_file
+from guardian.export_pack import IMAGE_FORMATS, write_pack
+from guardian.fonts import preload as preload_fonts
+from guardian.metrics import counter, render_text as render_metrics, stage_histogram
+from guardian.render import DEFAULT_COPY, DEFAULT_FORMAT, FORMATS, CreativeSpec, format_slug, render_creative
+
+# Largest request body accepted
+MAX_BODY_MB = int(os.environ.get("GUARDIAN_API_MAX_BODY_MB", "32"))
+# Connections served concurrently by one worker process
+REQUEST_THREADS = int(os.environ.get("GUARDIAN_API_THREADS", "16"))
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_SECONDS = 15
+# Creatives rendered concurrently for one batch request
+BATCH_THREADS = int(os.environ.get("GUARDIAN_API_BATCH_THREADS", "4"))
+# Most creatives accepted in one batch request
+MAX_BATCH = 256
+# Memory ceiling for the product uploads kept per worker (their encoded bytes)
+PRODUCT_CACHE_MB = int(os.environ.get("GUARDIAN_API_PRODUCT_CACHE_MB", "128"))
+
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+ROUTES = ("/render", "/render/batch", "/compliance", "/export/pack", "/health", "/metrics")
+# Chunks of a streamed response are sent once this much is buffered
+CHUNK_BYTES = 64 * 1024
+_FORMATS_BY_SLUG = {format_slug(label): label for label in FORMATS}
+
+logger = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    """A client error, reported as JSON with the given HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ==================== REQUESTS ====================
+
+# Product bytes hash -> asset handle, so repeated uploads skip header parsing
+_products = LRUCache(64, PRODUCT_CACHE_MB * 1024 * 1024)
+# (creative hash, encoded size, size budget) -> compliance report
+_reports = LRUCache(1024)
+
+
+def decode_product(encoded):
+    try:
+        data = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        raise ApiError(400, "'image' must be base64-encoded image bytes")
+    digest = bytes_digest(data)
+    asset = _products.get(digest)
+    if asset is None:
+        try:
+            asset = ProductAsset.from_bytes(data)
+        except Exception as e:
+            raise ApiError(400, f"Unreadable product image: {e}")
+        _products.put(digest, asset)
+    return asset
+
+
+def int_field(body, name, default, lo, hi):
+    """An integer request field within [lo, hi]; missing or null gives default."""
+    value = body.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ApiError(400, f"'{name}' must be an integer")
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer")
+    if not lo <= value <= hi:
+        raise ApiError(400, f"'{name}' must be between {lo} and {hi}")
+    return value
+
+
+def max_bytes_field(body):
+    """The ``max_kb`` budget in bytes, or None."""
+    max_kb = int_field(body, "max_kb", None, 1, MAX_BODY_MB * 1024)
+    return max_kb * 1024 if max_kb else None
+
+
+def resolve_format(value):
+    """A FORMATS label from a label or slug."""
+    if value is None:
+        return DEFAULT_FORMAT
+    if value in FORMATS:
+        return value
+    label = _FORMATS_BY_SLUG.get(str(value).lower())
+    if label is None:
+        raise ApiError(400, f"Unknown format '{value}', expected one of {sorted(_FORMATS_BY_SLUG)}")
+    return label
+
+
+def spec_from_request(body, shared_image=None):
+    if not isinstance(body, dict):
+        raise ApiError(400, "Each creative must be a JSON object")
+    image = body.get("image", shared_image)
+    if image is None:
+        raise ApiError(400, "Missing 'image'")
+    copy = {}
+    for field, default in DEFAULT_COPY.items():
+        value = body.get(field)
+        if value is None:
+            value = default
+        elif not isinstance(value, str):
+            raise ApiError(400, f"'{field}' must be a string")
+        copy[field] = value
+    remove_background = body.get("remove_background", False)
+    if not isinstance(remove_background, bool):
+        raise ApiError(400, "'remove_background' must be true or false")
+    return CreativeSpec(
+        product=decode_product(image),
+        format=resolve_format(body.get("format")),
+        remove_background=remove_background,
+        **copy,
+    )
+
+
+def render_request(body, shared_image=None, include_image=True):
+    """Render one creative; returns (response dict, ExportedFile or None)."""
+    spec = spec_from_request(body, shared_image)
+    image_format = str(body.get("image_format", "JPEG")).upper()
+    if image_format not in CONTENT_TYPES:
+        raise ApiError(400, "'image_format' must be JPEG or PNG")
+
+    quality = int_field(body, "quality", 85, 1, 100)
+    max_bytes = max_bytes_field(body)
+
+    creative_key = spec.cache_key()
+    canvas = render_creative(spec)
+    exported = None
+    if include_image:
+        exported = export_file(canvas, creative_key, image_format=image_format, quality=quality, max_bytes=max_bytes)
+    # The same budget fits the JPEG and judges the File Size check, as in /export/pack
+    budget = max_bytes or MAX_FILE_BYTES
+    key = (creative_key, exported.size if exported else None, budget)
+    report = _reports.get(key)
+    if report is None:
+        report = check_creative(spec, canvas, encoded=exported.view if exported else None, max_bytes=budget)
+        _reports.put(key, report)
+
+    response = {
+        "format": spec.format,
+        "width": canvas.width,
+        "height": canvas.height,
+        "compliance": report.as_dict(),
+    }
+    if exported is not None:
+        response.update(
+            content_type=CONTENT_TYPES[image_format],
+            bytes=exported.size,
+            quality=exported.quality,
+        )
+    return response, exported
+
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def _pool():
+    # Created lazily, i.e. after the worker process has forked
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ThreadPoolExecutor(max_workers=BATCH_THREADS, thread_name_prefix="guardian-api")
+        return _batch_pool
+
+
+def render_batch(body):
+    """Render every creative in body["requests"]; failures are reported per item and never fail the batch."""
+    if not isinstance(body, dict) or not isinstance(body.get("requests"), list):
+        raise ApiError(400, "Batch body must be an object with a 'requests' list")
+    items = body["requests"]
+    if len(items) > MAX_BATCH:
+        raise ApiError(413, f"At most {MAX_BATCH} creatives per batch")
+    shared_image = body.get("image")
+
+    def one(item):
+        try:
+            response, exported = render_request(item, shared_image)
+            response["image"] = base64.b64encode(exported.view).decode("ascii")
+            return response
+        except ApiError as e:
+            return {"error": str(e), "status": e.status}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}", "status": 500}
+
+    return {"results": list(_pool().map(one, items))}
+
+
+def pack_options(body):
+    """write_pack() keyword arguments from a pack request."""
+    formats = body.get("formats") or list(FORMATS)
+    image_formats = body.get("image_formats") or list(IMAGE_FORMATS)
+    if not isinstance(formats, list) or not isinstance(image_formats, list):
+        raise ApiError(400, "'formats' and 'image_formats' must be lists")
+    image_formats = [str(f).upper() for f in image_formats]
+    if not set(image_formats) <= set(CONTENT_TYPES):
+        raise ApiError(400, "'image_formats' may only contain JPEG and PNG")
+    max_bytes = max_bytes_field(body)
+    return {
+        "formats": [resolve_format(f) for f in formats],
+        "image_formats": image_formats,
+        "quality": int_field(body, "quality", 85, 1, 100),
+        "folder": re.sub(r"[^A-Za-z0-9_-]+", "_", str(body.get("name", "creative_pack"))).strip("_") or "creative_pack",
+        **({"max_bytes": max_bytes} if max_bytes else {}),
+    }
+
+
+# ==================== HTTP ====================
+
+class ChunkedWriter:
+    """Write-only stream sent as an HTTP/1.1 chunked body, in chunks of about CHUNK_BYTES."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= CHUNK_BYTES:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self.wfile.write(b"%X\r\n%s\r\n" % (len(self._buffer), self._buffer))
+            self._buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive; every response sets Content-Length
+    # Headers and body go out in separate writes; without TCP_NODELAY a
+    # kept-alive connection stalls ~40ms per response on delayed ACKs
+    disable_nagle_algorithm = True
+    server_version = "GuidelineGuardian/1.0"
+    timeout = KEEPALIVE_SECONDS  # socket timeout, so idle connections free their thread
+    access_log = False
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type, headers=None):
+        self._status = status
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True
+            raise ApiError(400, "Invalid Content-Length")
+        if length > MAX_BODY_MB * 1024 * 1024:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            raise ApiError(413, f"Request body over {MAX_BODY_MB}MB")
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON")
+
+    def _timed(self, handle):
+        start = time.perf_counter()
+        self._status = 500
+        try:
+            handle()
+        finally:
+            path = self.path if self.path in ROUTES else "other"
+            stage_histogram("api_request").observe(time.perf_counter() - start, path=path)
+            counter("guardian_api_requests_total", "API requests by route and status").inc(
+                path=path, status=self._status)
+
+    def do_GET(self):
+        self._timed(self._get)
+
+    def do_POST(self):
+        self._timed(self._post)
+
+    def _get(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/metrics":
+            self._send(200, render_metrics().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": f"No route for GET {self.path}"})
+
+    def _post(self):
+        try:
+            if self.path == "/render":
+                self._render()
+            elif self.path == "/render/batch":
+                self._send_json(200, render_batch(self._read_json()))
+            elif self.path == "/export/pack":
+                self._export_pack()
+            elif self.path == "/compliance":
+                response, _ = render_request(self._read_json(), include_image=False)
+                self._send_json(200, response["compliance"])
+            else:
+                self._send_json(404, {"error": f"No route for POST {self.path}"})
+        except ApiError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _render(self):
+        response, exported = render_request(self._read_json())
+        accept = self.headers.get("Accept", "")
+        if response["content_type"] in accept:
+            # Raw file, no base64 overhead
+            compliance = response["compliance"]
+            self._send(200, exported.view, response["content_type"], {
+                "X-Compliance-Score": str(compliance["score"]),
+                "X-Compliance-Passed": str(compliance["passed"]).lower(),
+            })
+            return
+        response["image"] = base64.b64encode(exported.view).decode("ascii")
+        self._send_json(200, response)
+
+    def _export_pack(self):
+        body = self._read_json()
+        spec = spec_from_request(body)
+        options = pack_options(body)
+
+        self._status = 200
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", f'attachment; filename="{options["folder"]}.zip"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        stream = ChunkedWriter(self.wfile)
+        try:
+            write_pack(spec, stream, **options)
+        except Exception:
+            # Headers are gone; closing without the final chunk tells the
+            # client the archive is incomplete
+            logger.exception("Export pack failed")
+            self._status = 500
+            self.close_connection = True
+            return
+        stream.close()
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    threads = REQUEST_THREADS
+    _pool = None
+
+    def process_request(self, request, client_address):
+        # A bounded pool instead of ThreadingMixIn's thread per connection,
+        # created lazily like _pool()
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="guardian-http")
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+def _serve_worker(server):
+    preload_fonts()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host="0.0.0.0", port=8502, workers=1):
+    """Bind once, then pre-fork workers that all accept on the same socket."""
+    server = ApiServer((host, port), ApiHandler)
+    print(f"Guideline Guardian API on http://{host}:{server.server_address[1]} ({workers} workers)")
+    sys.stdout.flush()
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        _serve_worker(server)
+        return 0
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            _serve_worker(server)
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+    server.server_close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless creative render API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8502")))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--access-log", action="store_true", help="log every request to stderr")
+    args = parser.parse_args(argv)
+
+    ApiHandler.access_log = args.access_log
+    return serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+"""
+Non-destructive product asset pipeline.
+
+The uploaded original is kept once, untouched. Edits (rotate, crop, resize)
+are recorded as an operation chain and variants are derived lazily:
+
+* the edited base image is cached per operation chain
+* a 2x pyramid of the base (Image.reduce) is built on demand and shared by
+  every output size, so each format resamples from the nearest level
+  instead of LANCZOS-ing the full-resolution original again
+* fitted variants are cached per (operation chain, size)
+
+Decoded uploads live in one process-wide, content-addressed AssetCache with
+a memory ceiling and LRU eviction. Sessions only hold a ProductAsset handle
+(the encoded upload bytes, their hash and the edits), so identical packshots
+uploaded by many designers are decoded and stored once.
+
+Uploads are not decoded at full resolution up front. While an asset has no
+edits and its full-size image is not already in the cache, JPEG variants
+are decoded straight at reduced size with Pillow's draft mode (DCT scaling
+by 1/2, 1/4 or 1/8). The full decode only happens when a variant needs
+more than half the original resolution. Both kinds of decode are also kept
+in guardian.disk_cache, so other processes and restarts skip the decoder.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from PIL import Image
+
+from guardian.cache import LRUCache, nbytes
+from guardian.disk_cache import disk_cache
+from guardian.metrics import timed
+
+# Fitted variants kept per source image
+VARIANT_CACHE_SIZE = 32
+# Memory ceiling for decoded product images (and their derived variants)
+ASSET_CACHE_MB = int(os.environ.get("GUARDIAN_ASSET_CACHE_MB", "512"))
+# Draft-decoded variants kept per process, and their memory ceiling
+PROXY_CACHE_SIZE = 32
+PROXY_CACHE_MB = int(os.environ.get("GUARDIAN_PROXY_CACHE_MB", "32"))
+
+
+# ==================== CONTENT HASHING ====================
+
+# id(image) -> digest; entries are dropped when the image is garbage collected
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def image_digest(image):
+    """Return a stable content hash for a PIL image, computed once per object."""
+    key = id(image)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is not None:
+        return digest
+
+    h = hashlib.sha256()
+    h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("ascii"))
+    h.update(image.tobytes())
+    digest = h.hexdigest()
+
+    with _digests_lock:
+        _digests[key] = digest
+    weakref.finalize(image, _forget_digest, key)
+    return digest
+
+
+def _forget_digest(key):
+    with _digests_lock:
+        _digests.pop(key, None)
+
+
+def bytes_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# ==================== OPERATIONS ====================
+
+def _apply(image, op):
+    name, arg = op
+    if name == "rotate":
+        return image.rotate(arg, expand=True)
+    if name == "crop":
+        return image.crop(arg)
+    if name == "thumbnail":
+        resized = image.copy()
+        resized.thumbnail((arg, arg), Image.LANCZOS)
+        return resized
+    raise ValueError(f"Unknown asset operation '{name}'")
+
+
+def _append(ops, op):
+    """Add op to a chain, folding consecutive rotations together."""
+    if ops and op[0] == "rotate" and ops[-1][0] == "rotate":
+        degrees = (ops[-1][1] + op[1]) % 360
+        return ops[:-1] + ((("rotate", degrees),) if degrees else ())
+    return ops + (op,)
+
+
+class _Source:
+    """Original image plus every cache derived from it, shared by all edits."""
+
+    def __init__(self, image, digest=None):
+        self.image = image
+        self._digest = digest
+        self.lock = threading.Lock()
+        self.bases = {}      # ops -> edited full-resolution image
+        self.levels = {}     # (ops, n) -> base reduced by 2**n
+        self.variants = LRUCache(VARIANT_CACHE_SIZE)
+
+    @property
+    def digest(self):
+        # Hashing pixels is only needed when nothing cheaper was given
+        if self._digest is None:
+            self._digest = image_digest(self.image)
+        return self._digest
+
+    def nbytes(self):
+        """Approximate memory held by the original and everything derived from it."""
+        with self.lock:
+            images = [self.image, *self.bases.values(), *self.levels.values()]
+        images.extend(self.variants.values())
+        # Bases may be the original itself (empty op chain); count each once
+        unique = {id(img): img for img in images}.values()
+        return sum(nbytes(img) for img in unique)
+
+
+def _decode(data):
+    with timed("decode", mode="full"), Image.open(io.BytesIO(data)) as img:
+        return img.convert("RGB")
+
+
+def _load(digest, data):
+    """Decoded upload, from the disk cache if any process decoded it before."""
+    image = disk_cache.get_image("decoded", digest)
+    if image is None:
+        image = _decode(data)
+        disk_cache.put_image("decoded", digest, image)
+    return image
+
+
+# ==================== SHARED CACHE ====================
+
+class AssetCache:
+    """
+    Process-wide decoded images keyed by the hash of their encoded bytes.
+
+    When the total footprint passes max_bytes, least recently used sources
+    are dropped; they are decoded again from the session's bytes if needed.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def peek(self, digest):
+        """The decoded source if it is already cached, without loading it."""
+        with self._lock:
+            return self._sources.get(digest)
+
+    def get_or_load(self, digest, data):
+        with self._lock:
+            source = self._sources.get(digest)
+            if source is not None:
+                self._sources.move_to_end(digest)
+                self.hits += 1
+                return source
+            self.misses += 1
+
+        # Decode outside the lock; if two sessions race, the first one wins
+        loaded = _Source(_load(digest, data), digest)
+        with self._lock:
+            source = self._sources.setdefault(digest, loaded)
+            self._sources.move_to_end(digest)
+        self.trim()
+        return source
+
+    def trim(self):
+        """Evict least recently used sources until under the memory ceiling."""
+        with self._lock:
+            sources = list(self._sources.items())
+        sizes = {digest: source.nbytes() for digest, source in sources}
+        total = sum(sizes.values())
+
+        with self._lock:
+            # Never evict the most recently used source, it is being worked on
+            while total > self.max_bytes and len(self._sources) > 1:
+                digest, _ = self._sources.popitem(last=False)
+                total -= sizes.get(digest, 0)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            sources = list(self._sources.values())
+        return {
+            "entries": len(sources),
+            "bytes": sum(source.nbytes() for source in sources),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._sources.clear()
+
+
+asset_cache = AssetCache(ASSET_CACHE_MB * 1024 * 1024)
+
+# (digest, size) -> variant decoded in draft mode
+_proxies = LRUCache(PROXY_CACHE_SIZE, PROXY_CACHE_MB * 1024 * 1024)
+
+
+def _draft_decode(data, size):
+    """Decode a JPEG at the smallest DCT scale that is still at least size."""
+    with timed("decode", mode="draft"):
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("RGB", size)
+            img = img.convert("RGB")
+        if img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+        return img
+
+
+# ==================== ASSETS ====================
+
+class ProductAsset:
+    """
+    A product image plus an operation chain.
+
+    Assets are small immutable handles: uploads keep only their encoded bytes
+    and resolve the decoded image through asset_cache, while assets built from
+    an in-memory image pin it. with_op() returns a new handle on the same
+    original and caches.
+    """
+
+    def __init__(self, digest=None, ops=(), data=None, pinned=None, header=None):
+        self._digest = digest
+        self._data = data
+        self._pinned = pinned
+        self._header = header  # (format, size) of the encoded upload
+        self.ops = tuple(ops)
+
+    @classmethod
+    def from_image(cls, image, digest=None):
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return cls(pinned=_Source(image, digest))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Asset for uploaded file bytes; only the header is read here."""
+        with Image.open(io.BytesIO(data)) as img:
+            header = (img.format, img.size)
+        return cls(bytes_digest(data), data=data, header=header)
+
+    @property
+    def _source(self):
+        if self._pinned is not None:
+            return self._pinned
+        return asset_cache.get_or_load(self._digest, self._data)
+
+    def _derived(self, ops):
+        return ProductAsset(self._digest, ops, self._data, self._pinned, self._header)
+
+    @property
+    def digest(self):
+        """Content hash of the original plus the operation chain."""
+        base = self._pinned.digest if self._pinned is not None else self._digest
+        if not self.ops:
+            return base
+        return hashlib.sha256(f"{base}:{self.ops!r}".encode("utf-8")).hexdigest()
+
+    @property
+    def nbytes(self):
+        """Memory held by the handle itself: the encoded upload (decodes live in asset_cache)."""
+        return len(self._data) if self._data is not None else 0
+
+    @property
+    def original(self):
+        return self._source.image
+
+    def with_op(self, name, arg):
+        return self._derived(_append(self.ops, (name, arg)))
+
+    def reset(self):
+        """The unedited original."""
+        return self._derived(())
+
+    # ---------- derived images (treat as read-only) ----------
+
+    def image(self):
+        """Full-resolution image with the operation chain applied."""
+        source = self._source
+        with source.lock:
+            base = source.bases.get(self.ops)
+        if base is not None:
+            return base
+
+        base = source.image
+        for op in self.ops:
+            base = _apply(base, op)
+        with source.lock:
+            source.bases[self.ops] = base
+        return base
+
+    @property
+    def size(self):
+        if self._header is not None and not self.ops:
+            return self._header[1]
+        return self.image().size
+
+    def _level(self, n):
+        if n == 0:
+            return self.image()
+        key = (self.ops, n)
+        source = self._source
+        with source.lock:
+            level = source.levels.get(key)
+        if level is None:
+            level = self._level(n - 1).reduce(2)
+            with source.lock:
+                source.levels[key] = level
+        return level
+
+    def fit(self, max_width, max_height):
+        """
+        The asset scaled to fit inside max_width x max_height (never upscaled).
+
+        Resampling starts from the smallest pyramid level that is still at
+        least the target size, and the result is cached. Unedited JPEG
+        uploads that are not decoded yet are draft-decoded at reduced size
+        when the target is at most half the original.
+        """
+        w, h = self.size
+        scale = min(max_width / w, max_height / h, 1.0)
+        target = (max(round(w * scale), 1), max(round(h * scale), 1))
+
+        if (scale <= 0.5 and not self.ops and self._header is not None
+                and self._header[0] == "JPEG" and asset_cache.peek(self._digest) is None):
+            key = (self._digest, target)
+            proxy = _proxies.get(key)
+            if proxy is None:
+                proxy = disk_cache.get_image("draft", key)
+                if proxy is None:
+                    proxy = _draft_decode(self._data, target)
+                    disk_cache.put_image("draft", key, proxy)
+                _proxies.put(key, proxy)
+            return proxy
+
+        base = self.image()
+        if target == base.size:
+            return base
+
+        source = self._source
+        key = (self.ops, target)
+        variant = source.variants.get(key)
+        if variant is not None:
+            return variant
+
+        n = 0
+        while w >> (n + 1) >= target[0] and h >> (n + 1) >= target[1]:
+            n += 1
+        variant = self._level(n).resize(target, Image.LANCZOS)
+        source.variants.put(key, variant)
+        if self._pinned is None:
+            asset_cache.trim()
+        return variant
+
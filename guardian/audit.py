@@ -0,0 +1,196 @@
+"""
+Bulk compliance audit of already-exported creatives.
+
+    python -m guardian.audit deliverables/ --report audit.json
+    python -m guardian.audit deliverables/ --report audit.csv --workers 8
+
+Unlike guardian.compliance this works on finished files with no spec or
+layout, so every check is measured from the pixels alone with NumPy:
+
+* contrast    - strongest content contrast against the background colour
+* brand       - share of pixels within tolerance of Tesco red / blue
+* margins     - the safe-zone band along the edges is free of content
+* file size   - bytes on disk under the retailer limit
+
+Files are decoded at reduced resolution (JPEG draft mode / reduce) since none
+of the checks need full detail, and decoding runs across a process pool.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageColor
+
+from guardian.compliance import (
+    CONTRAST_NORMAL,
+    MAX_FILE_BYTES,
+    colour_fraction,
+    relative_luminance,
+)
+from guardian.layout import SAFE_MARGIN
+from guardian.metrics import timed
+from guardian.render import BRAND_BLUE, BRAND_RED
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Images are decoded down to roughly this size before checking
+AUDIT_MAX_SIDE = 768
+# Minimum share of pixels in a brand colour for it to count as present
+BRAND_MIN_FRACTION = 0.001
+# Share of edge-band pixels allowed to differ from the background
+MARGIN_MAX_FRACTION = 0.02
+# Per-channel distance from the background that counts as content
+CONTENT_TOLERANCE = 48
+
+REPORT_FIELDS = [
+    "path", "width", "height", "bytes", "passed",
+    "contrast", "contrast_ok", "brand_red", "brand_blue", "brand_ok",
+    "margin_intrusion", "margin_ok", "size_ok", "error",
+]
+
+
+def decode_for_audit(source):
+    """Open an image decoded near AUDIT_MAX_SIDE; returns (image, full size)."""
+    img = Image.open(source)
+    full_size = img.size
+    scale = max(full_size) / AUDIT_MAX_SIDE
+    if scale > 1:
+        # JPEG decodes straight to 1/2, 1/4 or 1/8 scale; other formats reduce after load
+        img.draft("RGB", (int(full_size[0] / scale), int(full_size[1] / scale)))
+        factor = int(max(img.size) / AUDIT_MAX_SIDE)
+        if factor > 1:
+            img = img.reduce(factor)
+    return img.convert("RGB"), full_size
+
+
+def background_colour(pixels):
+    """Median colour of the four corner patches."""
+    h, w = pixels.shape[:2]
+    k = max(min(h, w) // 50, 1)
+    corners = np.concatenate([
+        pixels[:k, :k].reshape(-1, 3), pixels[:k, -k:].reshape(-1, 3),
+        pixels[-k:, :k].reshape(-1, 3), pixels[-k:, -k:].reshape(-1, 3),
+    ])
+    return np.median(corners, axis=0).astype(np.uint8)
+
+
+def audit_pixels(pixels, size_bytes, max_bytes=MAX_FILE_BYTES):
+    """Run every check on an (h, w, 3) uint8 array."""
+    h, w = pixels.shape[:2]
+    background = background_colour(pixels)
+
+    # Contrast: 99th percentile of per-pixel contrast against the background
+    luminance = relative_luminance(pixels[::2, ::2])
+    bg_l = float(relative_luminance(background))
+    hi = np.maximum(luminance, bg_l)
+    lo = np.minimum(luminance, bg_l)
+    contrast = float(np.percentile((hi + 0.05) / (lo + 0.05), 99))
+
+    # Brand colours
+    sample = pixels[::2, ::2]
+    red = colour_fraction(sample, ImageColor.getrgb(BRAND_RED))
+    blue = colour_fraction(sample, ImageColor.getrgb(BRAND_BLUE))
+
+    # Margins: content pixels inside the edge band
+    m = max(int(min(h, w) * SAFE_MARGIN), 1)
+    content = (np.abs(pixels.astype(np.int16) - background.astype(np.int16)) > CONTENT_TOLERANCE).any(axis=-1)
+    band = np.ones((h, w), dtype=bool)
+    band[m:h - m, m:w - m] = False
+    intrusion = float(content[band].mean())
+
+    result = {
+        "bytes": size_bytes,
+        "contrast": round(contrast, 2),
+        "contrast_ok": contrast >= CONTRAST_NORMAL,
+        "brand_red": round(red, 4),
+        "brand_blue": round(blue, 4),
+        "brand_ok": red >= BRAND_MIN_FRACTION or blue >= BRAND_MIN_FRACTION,
+        "margin_intrusion": round(intrusion, 4),
+        "margin_ok": intrusion <= MARGIN_MAX_FRACTION,
+        "size_ok": size_bytes < max_bytes,
+    }
+    result["passed"] = all(result[k] for k in ("contrast_ok", "brand_ok", "margin_ok", "size_ok"))
+    return result
+
+
+def audit_image(image, size_bytes, max_bytes=MAX_FILE_BYTES):
+    """Audit an in-memory creative whose encoded size is already known."""
+    with timed("audit"):
+        if max(image.size) > AUDIT_MAX_SIDE:
+            image = image.reduce(max(image.size) // AUDIT_MAX_SIDE)
+        pixels = np.asarray(image.convert("RGB"))
+        return audit_pixels(pixels, size_bytes, max_bytes)
+
+
+def audit_file(path, max_bytes=MAX_FILE_BYTES):
+    """Audit one file on disk; errors are reported in the record, not raised, so one bad file cannot stop an audit."""
+    record = {"path": path}
+    try:
+        size_bytes = os.path.getsize(path)
+        with open(path, "rb") as f:
+            img, (width, height) = decode_for_audit(f)
+        record.update(width=width, height=height)
+        record.update(audit_pixels(np.asarray(img), size_bytes, max_bytes))
+        record["error"] = ""
+    except Exception as e:
+        record.update(passed=False, error=f"{type(e).__name__}: {e}")
+    return record
+
+
+def find_creatives(root):
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def run_audit(paths, workers=None, max_bytes=MAX_FILE_BYTES):
+    """Yield one audit record per path, in input order, decoded across a process pool."""
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(len(paths) // (workers * 8), 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(audit_file, paths, [max_bytes] * len(paths), chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit exported creatives against the Tesco guidelines")
+    parser.add_argument("root", help="directory of JPEG/PNG creatives")
+    parser.add_argument("--report", required=True, help="output report (.json or .csv)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-kb", type=int, default=MAX_FILE_BYTES // 1024)
+    args = parser.parse_args(argv)
+
+    paths = list(find_creatives(args.root))
+    print(f"Auditing {len(paths)} creatives")
+
+    start = time.perf_counter()
+    as_csv = args.report.lower().endswith(".csv")
+    failed = 0
+    records = []
+    with open(args.report, "w", newline="", encoding="utf-8") as out:
+        writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS, extrasaction="ignore") if as_csv else None
+        if writer:
+            writer.writeheader()
+        for record in run_audit(paths, args.workers, args.max_kb * 1024):
+            failed += not record["passed"]
+            if writer:
+                writer.writerow(record)
+            else:
+                records.append(record)
+        if not writer:
+            json.dump({"total": len(paths), "failed": failed, "creatives": records}, out, indent=2)
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {len(paths) - failed} passed, {failed} failed in {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
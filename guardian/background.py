@@ -0,0 +1,108 @@
+"""
+CPU background removal for studio packshots.
+
+Packshots are shot against a plain (usually white) backdrop, so the
+background is the region of backdrop-coloured pixels connected to the image
+border. It is found with a flood fill done as vectorized NumPy row/column
+sweeps on a downsampled copy; everything not reached is the product. The
+resulting alpha mask is feathered, cached per asset hash (so a packshot is
+segmented once for every format and session, and once per disk cache for
+every process) and scaled to whichever variant size the render engine
+pastes.
+"""
+
+import os
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from guardian.cache import LRUCache
+from guardian.disk_cache import disk_cache
+
+# Segmentation runs on a copy no larger than this
+MASK_SIDE = 512
+# Per-channel distance from the backdrop colour still counted as backdrop
+BACKDROP_TOLERANCE = 28
+# Below this share of product pixels segmentation is treated as failed
+MIN_PRODUCT_FRACTION = 0.01
+# Number of masks kept per process, and their memory ceiling
+MASK_CACHE_SIZE = int(os.environ.get("GUARDIAN_MASK_CACHE_SIZE", "128"))
+MASK_CACHE_MB = int(os.environ.get("GUARDIAN_MASK_CACHE_MB", "32"))
+
+_masks = LRUCache(MASK_CACHE_SIZE, MASK_CACHE_MB * 1024 * 1024)
+
+
+def _backdrop_colour(pixels):
+    """Median colour of the outermost pixel ring."""
+    ring = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    return np.median(ring, axis=0)
+
+
+def _sweep_rows(reached, candidate):
+    """Mark every run of candidate pixels in a row that touches a reached pixel."""
+    h, w = candidate.shape
+    flat = candidate.ravel()
+    starts = flat.copy()
+    starts[1:] &= ~flat[:-1]
+    starts[::w] = flat[::w]
+    run = np.cumsum(starts) * flat  # run id per pixel, 0 outside candidate runs
+    hit = np.zeros(int(starts.sum()) + 1, dtype=bool)
+    hit[run[reached.ravel() & flat]] = True
+    hit[0] = False
+    return hit[run].reshape(h, w)
+
+
+def flood_from_border(candidate):
+    """Candidate pixels connected (4-neighbourhood) to the image border."""
+    reached = np.zeros_like(candidate)
+    reached[0], reached[-1] = candidate[0], candidate[-1]
+    reached[:, 0], reached[:, -1] = candidate[:, 0], candidate[:, -1]
+
+    count = -1
+    # Alternate row and column sweeps until nothing new is reached
+    while True:
+        reached = _sweep_rows(reached, candidate)
+        reached = np.ascontiguousarray(_sweep_rows(reached.T.copy(), candidate.T.copy()).T)
+        total = int(reached.sum())
+        if total == count:
+            return reached
+        count = total
+
+
+def segment(image):
+    """Alpha mask (mode L, same size as image): 255 product, 0 backdrop."""
+    pixels = np.asarray(image.convert("RGB")).astype(np.int16)
+    backdrop = _backdrop_colour(pixels)
+    candidate = (np.abs(pixels - backdrop) <= BACKDROP_TOLERANCE).all(axis=-1)
+    background = flood_from_border(candidate)
+    if 1 - background.mean() < MIN_PRODUCT_FRACTION:
+        # No distinct product found (e.g. not a studio shot) - keep the image opaque
+        return Image.new("L", image.size, 255)
+    mask = Image.fromarray(np.where(background, 0, 255).astype(np.uint8), "L")
+    # Soften the cut so edges don't alias when scaled up
+    return mask.filter(ImageFilter.GaussianBlur(1))
+
+
+def product_mask(asset, size=None):
+    """
+    Cached alpha mask for a ProductAsset, scaled to size if given.
+
+    Segmentation runs once per asset hash on a copy of at most MASK_SIDE.
+    """
+    mask = _masks.get(asset.digest)
+    if mask is None:
+        mask = disk_cache.get_image("mask", asset.digest)
+        if mask is None:
+            mask = segment(asset.fit(MASK_SIDE, MASK_SIDE))
+            disk_cache.put_image("mask", asset.digest, mask)
+        _masks.put(asset.digest, mask)
+    if size is not None and mask.size != tuple(size):
+        mask = mask.resize(size, Image.BILINEAR)
+    return mask
+
+
+def cutout(asset, max_width, max_height):
+    """RGBA preview of the product with its background removed."""
+    variant = asset.fit(max_width, max_height).convert("RGBA")
+    variant.putalpha(product_mask(asset, variant.size))
+    return variant
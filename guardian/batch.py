@@ -0,0 +1,214 @@
+"""
+Batch campaign renderer.
+
+Renders every format for every SKU (and every copy variant) across a process
+pool and streams each finished creative to disk as soon as it is ready.
+
+    python -m guardian.batch --images packshots/ --copy copy.json --out out/
+    python -m guardian.batch --manifest skus.csv --out out/ --workers 8
+
+A manifest is a CSV or JSON list of rows with at least ``sku`` and ``image``
+(path, relative to the manifest). Any of ``headline``, ``subhead``,
+``value_tile``, ``tag`` and ``background`` may be given per row and override
+the copy variant. A copy file is a JSON list of such dicts; each entry is
+rendered for every SKU.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+
+from guardian.assets import ProductAsset
+from guardian.encoding import encode_to_budget
+from guardian.fonts import preload as preload_fonts
+from guardian.render import COPY_FIELDS, DEFAULT_COPY, FORMATS, CreativeSpec, format_slug, render_creative
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# ==================== INPUTS ====================
+
+def skus_from_directory(directory):
+    """One SKU per image file, named after the file stem."""
+    rows = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            rows.append({"sku": os.path.splitext(name)[0], "image": os.path.join(directory, name)})
+    return rows
+
+
+def skus_from_manifest(path):
+    """Read SKU rows from a CSV or JSON manifest."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    for row in rows:
+        if not row.get("sku") or not row.get("image"):
+            raise ValueError(f"Manifest row needs 'sku' and 'image': {row}")
+        row["image"] = os.path.join(base, row["image"])
+    return rows
+
+
+def load_copy_variants(path):
+    if path is None:
+        return [dict(DEFAULT_COPY)]
+    with open(path, encoding="utf-8") as f:
+        variants = json.load(f)
+    return [{**DEFAULT_COPY, **v} for v in variants]
+
+
+# ==================== WORKER ====================
+
+@lru_cache(maxsize=4)
+def _load_product(path):
+    with open(path, "rb") as f:
+        return ProductAsset.from_bytes(f.read())
+
+
+def render_sku(row, variants, formats, out_dir, image_format="JPEG", quality=85, max_bytes=None):
+    """
+    Render all variants x formats for one SKU and write them to out_dir/<sku>/.
+
+    Runs inside a pool worker; the product is decoded once per SKU and its
+    resize pyramid is shared by every format. With max_bytes set, JPEGs are
+    encoded at the best quality that fits the budget instead of at a fixed
+    quality. Returns one result record per written file. A failure is
+    reported as a final {"sku", "image", "error"} record instead of raised,
+    so one unreadable packshot cannot stop the campaign.
+    """
+    records = []
+    try:
+        _render_sku(row, variants, formats, out_dir, image_format, quality, max_bytes, records)
+    except Exception as e:
+        records.append({"sku": row.get("sku"), "image": row.get("image"), "error": f"{type(e).__name__}: {e}"})
+    return records
+
+
+def _render_sku(row, variants, formats, out_dir, image_format, quality, max_bytes, records):
+    # Appends as files are written, so records survive a failure halfway through
+    product = _load_product(row["image"])
+    sku_dir = os.path.join(out_dir, row["sku"])
+    os.makedirs(sku_dir, exist_ok=True)
+    ext = "jpg" if image_format == "JPEG" else "png"
+
+    for index, variant in enumerate(variants):
+        copy = {field: row.get(field) or variant[field] for field in COPY_FIELDS}
+        for label in formats:
+            start = time.perf_counter()
+            spec = CreativeSpec(product=product, format=label, **copy)
+            canvas = render_creative(spec, use_cache=False)
+
+            path = os.path.join(sku_dir, f"v{index}_{format_slug(label)}.{ext}")
+            used_quality = quality
+            if image_format == "JPEG" and max_bytes:
+                result = encode_to_budget(canvas, max_bytes)
+                used_quality = result.quality
+                with open(path, "wb") as f:
+                    f.write(result.data)
+            elif image_format == "JPEG":
+                canvas.save(path, format="JPEG", quality=quality, optimize=True)
+            else:
+                canvas.save(path, format="PNG")
+
+            records.append({
+                "sku": row["sku"],
+                "variant": index,
+                "format": label,
+                "path": path,
+                "bytes": os.path.getsize(path),
+                "quality": used_quality if image_format == "JPEG" else None,
+                "seconds": round(time.perf_counter() - start, 4),
+            })
+
+
+# ==================== DRIVER ====================
+
+def run_batch(rows, variants, out_dir, formats=None, workers=None, image_format="JPEG", quality=85,
+              max_bytes=None):
+    """
+    Render every SKU row across a process pool.
+
+    Yields result records as SKUs complete. At most a few tasks per worker are
+    in flight at once, so memory stays flat for manifests of any length.
+    """
+    formats = list(formats or FORMATS)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    os.makedirs(out_dir, exist_ok=True)
+
+    rows = iter(rows)
+    with ProcessPoolExecutor(max_workers=workers, initializer=preload_fonts) as pool:
+        pending = set()
+        while True:
+            for row in rows:
+                pending.add(pool.submit(render_sku, row, variants, formats, out_dir, image_format, quality, max_bytes))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every format for every SKU")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="directory of product images (one SKU per file)")
+    source.add_argument("--manifest", help="CSV or JSON manifest with sku,image[,copy fields]")
+    parser.add_argument("--copy", help="JSON list of copy variants")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--formats", nargs="*", choices=[format_slug(f) for f in FORMATS],
+                        help="restrict to these formats (default: all)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--image-format", choices=["JPEG", "PNG"], default="JPEG")
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--max-kb", type=int, default=None,
+                        help="encode each JPEG at the best quality under this size (overrides --quality)")
+    args = parser.parse_args(argv)
+
+    rows = skus_from_directory(args.images) if args.images else skus_from_manifest(args.manifest)
+    variants = load_copy_variants(args.copy)
+    formats = [f for f in FORMATS if not args.formats or format_slug(f) in args.formats]
+
+    total = len(rows) * len(variants) * len(formats)
+    print(f"Rendering {total} creatives ({len(rows)} SKUs x {len(variants)} variants x {len(formats)} formats)")
+
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    done = failed = 0
+    # Results are appended as they arrive so a partial run still leaves a usable log
+    with open(os.path.join(args.out, "results.jsonl"), "a", encoding="utf-8") as log:
+        max_bytes = args.max_kb * 1024 if args.max_kb else None
+        for record in run_batch(rows, variants, args.out, formats, args.workers,
+                                args.image_format, args.quality, max_bytes):
+            log.write(json.dumps(record) + "\n")
+            log.flush()
+            if record.get("error"):
+                failed += 1
+                print(f"  {record['sku']}: {record['error']}", file=sys.stderr)
+                continue
+            done += 1
+            if done % 50 == 0 or done == total:
+                print(f"  {done}/{total}")
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {done} creatives in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f}/s)")
+    if failed:
+        print(f"{failed} SKUs failed, see results.jsonl", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+In-memory caches shared by all sessions in a process.
+
+Caches holding images or encoded files take a byte ceiling as well as an
+entry count, so a handful of large canvases cannot outgrow the memory a
+worker is sized for. Sizes are estimated by nbytes(): pixels times bands
+for images (as AssetCache counts decoded uploads), the length of bytes and
+buffers, and the nbytes attribute of anything else that has one.
+"""
+
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+def nbytes(value):
+    """Approximate memory held by a cached value."""
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return getattr(value, "nbytes", 0)
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU mapping shared by all sessions in the process.
+
+    Holds at most maxsize entries and, when max_bytes is given, at most
+    max_bytes of values as estimated by nbytes(); the most recent entry is
+    always kept, even when it alone is over the ceiling.
+    """
+
+    def __init__(self, maxsize, max_bytes=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        size = nbytes(value) if self.max_bytes is not None else 0
+        with self._lock:
+            self.nbytes += size - self._sizes.get(key, 0)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or (
+                    self.max_bytes is not None and self.nbytes > self.max_bytes and len(self._data) > 1):
+                old, _ = self._data.popitem(last=False)
+                self.nbytes -= self._sizes.pop(old)
+
+    def values(self):
+        with self._lock:
+            return list(self._data.values())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,232 @@
+"""
+Compliance rule engine.
+
+Measures a rendered creative against the Tesco guidelines listed in the
+Export tab. Geometry (font sizes, safe zones) comes from the resolved layout,
+contrast is measured on the rendered pixels of every text region using WCAG
+relative luminance, and file size comes from the encoded bytes. All pixel
+work is vectorized with NumPy so a check takes a few milliseconds.
+
+Low-resolution proxies (spec.scale < 1) are checked with the full-size
+layout for geometry, their own pixels for contrast (against the full-size
+thresholds) and a file size extrapolated from the proxy's.
+"""
+
+import io
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image, ImageColor
+
+from guardian.layout import MIN_FONT_SIZE, scale_layout
+from guardian.metrics import counter, timed
+from guardian.render import BRAND_BLUE, BRAND_RED, TEXT_COLOURS, layout_for
+
+MAX_FILE_BYTES = 500 * 1024
+
+APPROVED_VALUE_TILES = ["Clubcard Price", "Price Lock", "New", "Reduced"]
+APPROVED_TAGS = ["Available at Tesco", "Only at Tesco", "Clubcard/app required"]
+
+# WCAG 2.x minimum contrast; text of 24px and up counts as large text
+CONTRAST_NORMAL = 4.5
+CONTRAST_LARGE = 3.0
+LARGE_TEXT_SIZE = 24
+
+# Max per-channel distance for a pixel to count as a brand colour
+BRAND_TOLERANCE = 40
+# Colour presence is measured on a canvas downsampled by this factor
+SAMPLE_STRIDE = 4
+
+
+@dataclass
+class CheckResult:
+    name: str
+    passed: bool
+    detail: str
+    value: Optional[float] = None  # the measurement behind the check, where there is one
+
+
+@dataclass
+class ComplianceReport:
+    checks: List[CheckResult] = field(default_factory=list)
+
+    @property
+    def score(self):
+        """Percentage of checks passed."""
+        if not self.checks:
+            return 0
+        return round(100 * sum(c.passed for c in self.checks) / len(self.checks))
+
+    @property
+    def passed(self):
+        return all(c.passed for c in self.checks)
+
+    def as_dict(self):
+        return {
+            "score": self.score,
+            "passed": self.passed,
+            "checks": [{"name": c.name, "passed": c.passed, "detail": c.detail} for c in self.checks],
+        }
+
+
+# ==================== PIXEL MATH ====================
+
+# sRGB channel value -> linear light, as a lookup table
+_LINEAR = np.array([
+    c / 255 / 12.92 if c / 255 <= 0.03928 else ((c / 255 + 0.055) / 1.055) ** 2.4
+    for c in range(256)
+])
+_LUMA = np.array([0.2126, 0.7152, 0.0722])
+
+
+def relative_luminance(pixels):
+    """WCAG relative luminance of an (..., 3) uint8 array."""
+    return _LINEAR[pixels] @ _LUMA
+
+
+def contrast_ratio(l1, l2):
+    hi, lo = max(l1, l2), min(l1, l2)
+    return (hi + 0.05) / (lo + 0.05)
+
+
+def colour_fraction(pixels, colour, tolerance=BRAND_TOLERANCE):
+    """Share of pixels within tolerance (per channel) of an RGB colour."""
+    lo = np.clip(np.array(colour) - tolerance, 0, 255).astype(np.uint8)
+    hi = np.clip(np.array(colour) + tolerance, 0, 255).astype(np.uint8)
+    inside = ((pixels >= lo) & (pixels <= hi)).all(axis=-1)
+    return float(inside.mean())
+
+
+def text_contrast(image, box, text_rgb, proxy=False):
+    """
+    Contrast between text colour and its surroundings inside box.
+
+    Pixels far from the text colour are the background behind the glyphs;
+    their median luminance is compared with the text colour's luminance.
+    On a proxy the glyphs are a few pixels wide and antialiased edges make up
+    much of the box, so only pixels at least half as far from the text colour
+    as the farthest one count as background.
+    """
+    x0, y0 = max(box.x0, 0), max(box.y0, 0)
+    x1, y1 = min(box.x1, image.width), min(box.y1, image.height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    region = np.asarray(image.crop((x0, y0, x1, y1))).reshape(-1, 3)
+    distance = np.abs(region.astype(np.int16) - np.array(text_rgb, dtype=np.int16)).sum(axis=1)
+    cutoff = max(96, int(distance.max()) // 2) if proxy else 96
+    background = region[distance > cutoff]
+    # A few thousand samples pin the median down; no need to sort them all
+    background = background[::max(len(background) // 4096, 1)]
+    if background.size == 0:
+        # Everything around the glyphs is the text colour: the text is invisible
+        return 1.0
+    text_l = float(relative_luminance(np.array(text_rgb, dtype=np.uint8)))
+    background_l = float(np.median(relative_luminance(background)))
+    return contrast_ratio(text_l, background_l)
+
+
+# ==================== RULES ====================
+
+def _check_brand(spec, image):
+    problems = []
+    if spec.value_tile not in APPROVED_VALUE_TILES:
+        problems.append(f"value tile '{spec.value_tile}' is not approved")
+    if spec.tag not in APPROVED_TAGS:
+        problems.append(f"tag '{spec.tag}' is not approved")
+    w, h = image.size
+    sample = np.asarray(image.resize((max(w // SAMPLE_STRIDE, 1), max(h // SAMPLE_STRIDE, 1)), Image.NEAREST))
+    red = colour_fraction(sample, ImageColor.getrgb(BRAND_RED))
+    blue = colour_fraction(sample, ImageColor.getrgb(BRAND_BLUE))
+    if red == 0 and blue == 0:
+        problems.append("no Tesco red or blue on the canvas")
+    detail = "; ".join(problems) or f"Tesco red {red:.1%}, blue {blue:.1%} of canvas"
+    return CheckResult("Brand Guidelines", not problems, detail)
+
+
+def _check_font_size(layout):
+    small = [f"{slot} {block.font_size}px" for slot, block in layout.blocks.items()
+             if block.font_size < MIN_FONT_SIZE]
+    truncated = [slot for slot, block in layout.blocks.items() if block.truncated]
+    problems = []
+    if small:
+        problems.append("below minimum: " + ", ".join(small))
+    if truncated:
+        problems.append("truncated to fit: " + ", ".join(truncated))
+    sizes = [block.font_size for block in layout.blocks.values()]
+    detail = "; ".join(problems) or (f"smallest text {min(sizes)}px" if sizes else "no text")
+    return CheckResult(f"Font Size (≥{MIN_FONT_SIZE}px)", not problems, detail, min(sizes, default=None))
+
+
+def _check_contrast(layout, image, pixels=None):
+    # pixels: the layout the image was drawn with, when it is a proxy of layout
+    pixels = pixels or layout
+    worst = None
+    failures = []
+    for slot, block in layout.blocks.items():
+        ratio = text_contrast(image, pixels.blocks[slot].bbox, ImageColor.getrgb(TEXT_COLOURS[slot]),
+                              proxy=pixels is not layout)
+        if ratio is None:
+            continue
+        required = CONTRAST_LARGE if block.font_size >= LARGE_TEXT_SIZE else CONTRAST_NORMAL
+        if ratio < required:
+            failures.append(f"{slot} {ratio:.1f}:1 < {required}:1")
+        if worst is None or ratio < worst:
+            worst = ratio
+    detail = "; ".join(failures) or (f"lowest {worst:.1f}:1" if worst else "no text")
+    return CheckResult("Color Contrast", not failures, detail, worst)
+
+
+def _check_safe_zones(layout):
+    safe = layout.frame.safe_zone
+    outside = [slot for slot, block in layout.blocks.items() if not safe.contains(block.bbox)]
+    if not safe.contains(layout.frame.value_tile):
+        outside.append("value tile")
+    if not safe.contains(layout.frame.product):
+        outside.append("product")
+    detail = ("outside safe zone: " + ", ".join(outside)) if outside else "all elements inside safe zone"
+    return CheckResult("Safe Zones", not outside, detail)
+
+
+def _check_file_size(size_bytes, max_bytes, estimated=False):
+    limit_kb = max_bytes // 1024
+    detail = f"{'~' if estimated else ''}{size_bytes / 1024:.1f}KB"
+    return CheckResult(f"File Size (<{limit_kb}KB)", size_bytes < max_bytes, detail, size_bytes)
+
+
+def check_creative(spec, image, encoded=None, max_bytes=MAX_FILE_BYTES, size_bytes=None):
+    """
+    Run every rule against a rendered creative.
+
+    encoded is the exported file (bytes or memoryview), or size_bytes its
+    size when it was streamed elsewhere; when both are omitted the image is
+    encoded as JPEG at quality 85, the default export setting. For proxies
+    that size is scaled up by pixel count as an estimate.
+    """
+    estimated = False
+    proxy = spec.scale != 1.0
+    with timed("compliance", proxy=proxy):
+        if encoded is not None:
+            size_bytes = len(encoded) if not isinstance(encoded, memoryview) else encoded.nbytes
+        elif size_bytes is None:
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=85)
+            size_bytes = buffer.tell()
+            if proxy:
+                size_bytes, estimated = int(size_bytes / spec.scale ** 2), True
+
+        layout = layout_for(spec, full_size=True)
+        drawn = scale_layout(layout, spec.scale) if spec.scale != 1.0 else layout
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        report = ComplianceReport([
+            _check_brand(spec, image),
+            _check_font_size(layout),
+            _check_contrast(layout, image, drawn),
+            _check_safe_zones(layout),
+            _check_file_size(size_bytes, max_bytes, estimated),
+        ])
+    counter("guardian_compliance_checks_total", "Compliance checks by outcome").inc(
+        passed=report.passed, proxy=proxy)
+    return report
@@ -0,0 +1,306 @@
+"""
+Persistent on-disk cache shared by worker processes and restarts.
+
+The in-memory LRUs die with the process, so every restart, every API worker
+and every replica used to decode, segment, rasterize and encode the same
+content again. Decoded uploads, background masks, render layers and
+encoded exports are also written here, keyed by the same content hashes:
+
+    image = disk_cache.get_image("mask", asset.digest)
+    if image is None:
+        image = segment(...)
+        disk_cache.put_image("mask", asset.digest, image)
+
+One file per entry, at <dir>/<version>/<namespace>/<xx>/<sha256 of key>,
+where the version covers the file format, guardian.layout.RENDER_VERSION
+and the Pillow version, so a deploy that renders differently never reads
+entries written by the previous one.
+Writes go to a temporary file in the same directory and are published with
+os.replace(), so readers in any process see a complete entry or none; a
+header carrying the payload length rejects anything else. Reads of larger
+entries are memory-mapped, so an encoded export is served straight from
+the page cache and RGBA/L images wrap the mapping without a copy. Hits
+refresh the file's mtime and the total size is kept under GUARDIAN_DISK_CACHE_MB
+by deleting the least recently used files, from whichever process notices
+first (a file deleted under a reader stays readable through its mapping).
+
+The directory is GUARDIAN_CACHE_DIR (default: guideline-guardian in the
+system temp directory); set it to an empty string to disable the cache.
+It is created private (0700) and the cache disables itself if it belongs
+to another user. Mount a shared volume there to share it between replicas
+on one host. Trimming and clear() only touch the version directories, never
+anything else under GUARDIAN_CACHE_DIR. Any failure to read or write only
+costs a cache miss.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import PIL
+from PIL import Image
+
+from guardian.layout import RENDER_VERSION
+from guardian.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("GUARDIAN_CACHE_DIR", os.path.join(tempfile.gettempdir(), "guideline-guardian"))
+# Size ceiling for everything under CACHE_DIR
+DISK_CACHE_MB = int(os.environ.get("GUARDIAN_DISK_CACHE_MB", "2048"))
+# Bump when a cached representation changes; old versions age out by LRU
+FORMAT_VERSION = 1
+# Entries smaller than this are read into memory instead of mapped
+MMAP_MIN_BYTES = 64 * 1024
+# The directory is re-scanned for trimming after this share of the ceiling is written
+TRIM_EVERY = 1 / 16
+# Hits refresh the mtime at most this often (seconds)
+TOUCH_INTERVAL = 60
+# Leftover temporary files (from a crashed writer) are removed after this long
+STALE_TEMP_SECONDS = 3600
+
+_MAGIC = b"GGC1"
+_HEADER = struct.Struct("<4sI")  # magic, JSON header length
+_TEMP_PREFIX = ".tmp-"
+_VERSION_DIRS = "v*-pillow*"
+# Image modes Image.frombuffer can wrap without copying
+_MAPPABLE_MODES = ("L", "RGBA", "RGBX", "CMYK", "I;16")
+
+
+class Entry:
+    """A cached payload (a read-only memoryview) and its metadata."""
+
+    __slots__ = ("meta", "view")
+
+    def __init__(self, meta, view):
+        self.meta = meta
+        self.view = view
+
+
+def key_digest(key):
+    """Stable hash of a cache key (strings, numbers, tuples, frozen dataclasses)."""
+    return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = bool(root) and self._open_root()
+        self._dir = os.path.join(root, f"v{FORMAT_VERSION}-r{RENDER_VERSION}-pillow{PIL.__version__}") if root else None
+        self._written = 0
+        self._total = None  # bytes on disk at the last trim
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _open_root(self):
+        """Create root private to this user; False if it is unusable or someone else's."""
+        try:
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            stat = os.lstat(self.root)
+        except OSError as e:
+            logger.warning("Disk cache disabled, cannot create %s: %s", self.root, e)
+            return False
+        if not os.path.isdir(self.root) or os.path.islink(self.root):
+            logger.warning("Disk cache disabled, %s is not a directory", self.root)
+            return False
+        if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+            logger.warning("Disk cache disabled, %s is owned by another user", self.root)
+            return False
+        return True
+
+    def path(self, namespace, key):
+        digest = key_digest(key)
+        return os.path.join(self._dir, namespace, digest[:2], digest)
+
+    def _count(self, namespace, result):
+        counter("guardian_disk_cache_total", "Disk cache lookups by namespace and result").inc(
+            namespace=namespace, result=result)
+
+    def _failed(self, action, path, error):
+        self.errors += 1
+        logger.warning("Disk cache %s failed for %s: %s", action, path, error)
+
+    # ---------- raw entries ----------
+
+    def get(self, namespace, key):
+        """The Entry stored under key, or None."""
+        if not self.enabled:
+            return None
+        path = self.path(namespace, key)
+        try:
+            entry = self._read(path)
+        except FileNotFoundError:
+            entry = None
+        except (ValueError, KeyError, struct.error) as e:
+            self._failed("read", path, e)
+            self._remove(path)  # corrupt: so the next put() can replace it
+            entry = None
+        except OSError as e:
+            self._failed("read", path, e)  # possibly transient: keep the entry
+            entry = None
+        if entry is None:
+            self.misses += 1
+            self._count(namespace, "miss")
+        else:
+            self.hits += 1
+            self._count(namespace, "hit")
+        return entry
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < MMAP_MIN_BYTES:
+                buffer = f.read()
+            else:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path)  # LRU order for trim()
+            except OSError:
+                pass  # e.g. a read-only or foreign-owned shared volume
+
+        view = memoryview(buffer).toreadonly()
+        magic, header_len = _HEADER.unpack_from(view)
+        start = _HEADER.size + header_len
+        header = json.loads(bytes(view[_HEADER.size:start]))
+        if magic != _MAGIC or len(view) - start != header["size"]:
+            raise ValueError("truncated or foreign cache entry")
+        return Entry(header["meta"], view[start:])
+
+    def put(self, namespace, key, payload, meta=None):
+        """Store payload (bytes-like) under key, atomically; existing entries are kept."""
+        if not self.enabled:
+            return
+        path = self.path(namespace, key)
+        if os.path.exists(path):
+            # Content-addressed: whoever wrote it first wrote the same thing
+            return
+        payload = memoryview(payload).cast("B")
+        header = json.dumps({"meta": meta or {}, "size": payload.nbytes}).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp = tempfile.mkstemp(prefix=_TEMP_PREFIX, dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, len(header)))
+                    f.write(header)
+                    f.write(payload)
+                os.replace(temp, path)
+            except BaseException:
+                os.unlink(temp)
+                raise
+        except OSError as e:
+            self._failed("write", path, e)
+            return
+
+        with self._lock:
+            self._written += payload.nbytes
+            due = self._total is None or self._written >= self.max_bytes * TRIM_EVERY
+        if due:
+            self.trim()
+
+    # ---------- images ----------
+
+    def get_image(self, namespace, key):
+        """
+        Cached PIL image, or None. Treat it as read-only.
+
+        L and RGBA images wrap the file mapping directly; the extra
+        metadata given to put_image() is in image.info.
+        """
+        entry = self.get(namespace, key)
+        if entry is None:
+            return None
+        meta = dict(entry.meta)
+        mode, size = meta.pop("mode"), tuple(meta.pop("image_size"))
+        if mode in _MAPPABLE_MODES:
+            image = Image.frombuffer(mode, size, entry.view, "raw", mode, 0, 1)
+        else:
+            image = Image.frombytes(mode, size, entry.view)
+        image.info.update(meta)
+        return image
+
+    def put_image(self, namespace, key, image, **meta):
+        self.put(namespace, key, image.tobytes(), dict(meta, mode=image.mode, image_size=list(image.size)))
+
+    # ---------- housekeeping ----------
+
+    def _paths(self):
+        """Every file in the version directories under root, old versions included."""
+        for top in glob.glob(os.path.join(glob.escape(self.root), _VERSION_DIRS)):
+            for folder, _, names in os.walk(top):
+                for name in names:
+                    yield name, os.path.join(folder, name)
+
+    def _files(self):
+        """(mtime, size, path) of every entry, removing stale temporary files on the way."""
+        files = []
+        now = time.time()
+        for name, path in self._paths():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.startswith(_TEMP_PREFIX):
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    self._remove(path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            return False  # another process got there first
+
+    def trim(self):
+        """Delete least recently used entries until the cache is under 90% of its ceiling."""
+        if not self.enabled:
+            return
+        with self._lock:
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            if total > self.max_bytes:
+                files.sort()
+                target = self.max_bytes * 0.9
+                for _, size, path in files:
+                    if total <= target:
+                        break
+                    self._remove(path)
+                    total -= size
+            self._total, self._written = total, 0
+
+    def stats(self):
+        return {
+            "dir": self.root,
+            "enabled": self.enabled,
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+    def clear(self):
+        """Remove every entry (all versions)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for _, _, path in self._files():
+                self._remove(path)
+            self._total, self._written = 0, 0
+
+
+disk_cache = DiskCache(CACHE_DIR, DISK_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,198 @@
+"""
+Export encoding.
+
+encode_to_budget() binary-searches the JPEG quality (and optionally chroma
+subsampling and progressive mode) to land just under a byte budget, so a
+creative meets a retailer's file-size limit in one export. Encodes go into
+two in-memory buffers that are swapped rather than copied, and the search
+stops as soon as a result is within tolerance of the budget.
+
+export_file() caches encoded outputs per (creative hash, format, quality,
+optimize), so Export tab reruns never re-encode an unchanged creative. The
+files are also kept in guardian.disk_cache and served from a memory mapping
+when another process or an earlier run already encoded them.
+"""
+
+import io
+import itertools
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from guardian.compliance import MAX_FILE_BYTES
+from guardian.cache import LRUCache
+from guardian.disk_cache import disk_cache
+from guardian.metrics import timed
+
+# Number of encoded exports kept in memory per process, and their memory ceiling
+EXPORT_CACHE_SIZE = int(os.environ.get("GUARDIAN_EXPORT_CACHE_SIZE", "64"))
+EXPORT_CACHE_MB = int(os.environ.get("GUARDIAN_EXPORT_CACHE_MB", "64"))
+
+# Pillow's JPEG subsampling codes
+SUBSAMPLING_444 = 0
+SUBSAMPLING_420 = 2
+
+# A fallback setting is only tried while the best quality found is below this
+GOOD_QUALITY = 75
+
+
+@dataclass
+class EncodeResult:
+    data: bytes
+    quality: int
+    subsampling: int
+    progressive: bool
+    fits: bool      # size <= budget
+    attempts: int   # number of encodes performed
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+def _encode(image, buffer, quality, subsampling, progressive):
+    buffer.seek(0)
+    buffer.truncate()
+    image.save(buffer, format="JPEG", quality=quality, subsampling=subsampling,
+               progressive=progressive, optimize=True)
+    return buffer.tell()
+
+
+def encode_to_budget(image, max_bytes=MAX_FILE_BYTES, tolerance=0.05,
+                     min_quality=30, max_quality=95,
+                     subsampling="auto", progressive=False):
+    """
+    Encode image as the highest-quality JPEG that fits in max_bytes.
+
+    subsampling is a Pillow code (0 = 4:4:4, 2 = 4:2:0) or "auto" to try
+    4:4:4 first (crisper brand text) and fall back to 4:2:0 when 4:4:4 can
+    only fit below GOOD_QUALITY. progressive is True, False or "auto" (try
+    both the same way). Within one setting, any result between
+    (1 - tolerance) * max_bytes and max_bytes ends the search immediately.
+    If nothing fits, the smallest encode is returned with fits=False.
+    """
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    subsamplings = [SUBSAMPLING_444, SUBSAMPLING_420] if subsampling == "auto" else [subsampling]
+    progressives = [False, True] if progressive == "auto" else [bool(progressive)]
+    floor = max_bytes * (1 - tolerance)
+
+    work, best_buffer = io.BytesIO(), io.BytesIO()
+    best = None  # (quality, subsampling, progressive) held in best_buffer
+    attempts = 0
+
+    def keep(quality, sub, prog):
+        nonlocal work, best_buffer, best
+        if best is None or quality > best[0]:
+            work, best_buffer = best_buffer, work
+            best = (quality, sub, prog)
+
+    for sub, prog in itertools.product(subsamplings, progressives):
+        lo, hi = min_quality, max_quality
+        if best is not None and best[0] >= hi:
+            break
+
+        # Quality above the current best cannot be beaten by a lower one
+        if best is not None:
+            lo = best[0] + 1
+
+        size = _encode(image, work, hi, sub, prog)
+        attempts += 1
+        if size <= max_bytes:
+            keep(hi, sub, prog)
+            break
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            size = _encode(image, work, mid, sub, prog)
+            attempts += 1
+            if size <= max_bytes:
+                keep(mid, sub, prog)
+                if size >= floor:
+                    break
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if best is not None and best[0] >= GOOD_QUALITY:
+            break
+
+    if best is not None:
+        quality, sub, prog = best
+        return EncodeResult(best_buffer.getvalue(), quality, sub, prog, True, attempts)
+
+    # Nothing fits: hand back the smallest encode we can make
+    sub, prog = subsamplings[-1], progressives[-1]
+    _encode(image, work, min_quality, sub, prog)
+    attempts += 1
+    return EncodeResult(work.getvalue(), min_quality, sub, prog, False, attempts)
+
+
+# ==================== CACHED EXPORTS ====================
+
+@dataclass(frozen=True)
+class ExportedFile:
+    """An encoded creative; view is a read-only memoryview over the file bytes."""
+
+    view: memoryview
+    image_format: str
+    quality: Optional[int]
+
+    @property
+    def size(self):
+        return self.view.nbytes
+
+    @property
+    def nbytes(self):
+        return self.view.nbytes
+
+    @property
+    def data(self):
+        """The file as bytes (no copy unless it is served from the disk cache)."""
+        if isinstance(self.view.obj, bytes) and self.view.nbytes == len(self.view.obj):
+            return self.view.obj
+        return self.view.tobytes()
+
+
+_export_cache = LRUCache(EXPORT_CACHE_SIZE, EXPORT_CACHE_MB * 1024 * 1024)
+
+
+def export_file(image, creative_key, image_format="JPEG", quality=85, optimize=False, max_bytes=None):
+    """
+    Encode a rendered creative, cached per (creative, format, quality, optimize).
+
+    creative_key is the spec's content hash. JPEGs always get Huffman
+    optimization (cheap); PNG optimize is slow on large canvases and only
+    runs when asked for. With max_bytes, JPEG quality is picked by
+    encode_to_budget() and the quality argument is ignored.
+    """
+    key = (creative_key, image_format, quality, optimize, max_bytes)
+    exported = _export_cache.get(key)
+    if exported is not None:
+        return exported
+    entry = disk_cache.get("export", key)
+    if entry is not None:
+        exported = ExportedFile(entry.view, image_format, entry.meta["quality"])
+        _export_cache.put(key, exported)
+        return exported
+
+    with timed("encode", format=image_format, budget=bool(max_bytes)):
+        if image_format == "JPEG" and max_bytes:
+            fitted = encode_to_budget(image, max_bytes)
+            data, used_quality = fitted.data, fitted.quality
+        else:
+            buffer = io.BytesIO()
+            if image_format == "JPEG":
+                image.save(buffer, format="JPEG", quality=quality, optimize=True)
+                used_quality = quality
+            else:
+                image.save(buffer, format="PNG", optimize=optimize)
+                used_quality = None
+            # getvalue() hands over the internal buffer without copying
+            data = buffer.getvalue()
+
+    exported = ExportedFile(memoryview(data).toreadonly(), image_format, used_quality)
+    _export_cache.put(key, exported)
+    disk_cache.put("export", key, data, {"quality": used_quality})
+    return exported
@@ -0,0 +1,138 @@
+"""
+Multi-format export packs, streamed into a ZIP archive.
+
+A pack holds the creative in every format as JPEG (fitted to the file-size
+budget) and PNG, plus compliance.json with the report for every file:
+
+    with open("pack.zip", "wb") as f:
+        manifest = write_pack(spec, f, folder="summer_sale")
+
+Each format is rendered on a worker thread, which also runs the
+quality search for budget-fitted JPEGs (Pillow releases the GIL while
+encoding). Files are written into the archive in format order through
+ZipFile.open(name, "w") as soon as their format is ready, while later
+formats are still rendering: PNGs and fixed-quality JPEGs are saved
+straight into the archive entry, never buffered whole, and none of the
+files goes into the export caches. At most workers * 2 formats are in
+flight, so memory stays flat however many formats a pack has and whatever
+size the files are. The destination only needs write(): seekable files get
+a normal archive, sockets and other streams get one with data descriptors,
+which is how POST /export/pack on guardian.api streams a pack while it is
+being built.
+"""
+
+import dataclasses
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from guardian.compliance import MAX_FILE_BYTES, check_creative
+from guardian.encoding import encode_to_budget
+from guardian.render import COPY_FIELDS, FORMATS, format_slug, render_creative
+
+# Formats encoded concurrently for one pack
+PACK_WORKERS = int(os.environ.get("GUARDIAN_PACK_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+IMAGE_FORMATS = ("JPEG", "PNG")
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png"}
+REPORT_NAME = "compliance.json"
+
+
+def _render_format(spec, image_formats, max_bytes, fit_budget):
+    """Render one format: (canvas, {image format: EncodeResult} for budget-fitted JPEGs)."""
+    canvas = render_creative(spec)
+    fitted = {}
+    if fit_budget and "JPEG" in image_formats:
+        fitted["JPEG"] = encode_to_budget(canvas, max_bytes)
+    return canvas, fitted
+
+
+def _entry_info(name, compress_type):
+    info = ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+    info.compress_type = compress_type
+    return info
+
+
+def _write_entry(zf, name, data, compress_type):
+    info = _entry_info(name, compress_type)
+    info.file_size = len(data)
+    with zf.open(info, "w") as dest:
+        dest.write(data)
+
+
+def _write_format(zf, folder, spec, canvas, fitted, image_formats, quality, max_bytes):
+    """Write one format's files into the archive; returns their manifest entries."""
+    entries = []
+    for image_format in image_formats:
+        name = f"{format_slug(spec.format)}.{EXTENSIONS[image_format]}"
+        # JPEG and PNG are already compressed
+        info = _entry_info(f"{folder}/{name}", ZIP_STORED)
+        with zf.open(info, "w") as dest:
+            if image_format in fitted:
+                dest.write(fitted[image_format].data)
+                used_quality = fitted[image_format].quality
+            elif image_format == "JPEG":
+                canvas.save(dest, format="JPEG", quality=quality, optimize=True)
+                used_quality = quality
+            else:
+                canvas.save(dest, format="PNG")
+                used_quality = None
+        report = check_creative(spec, canvas, size_bytes=info.file_size, max_bytes=max_bytes)
+        entries.append({
+            "file": name,
+            "format": spec.format,
+            "width": canvas.width,
+            "height": canvas.height,
+            "image_format": image_format,
+            "bytes": info.file_size,
+            "quality": used_quality,
+            "compliance": report.as_dict(),
+        })
+    return entries
+
+
+def write_pack(spec, fileobj, formats=None, image_formats=IMAGE_FORMATS, quality=85,
+               max_bytes=MAX_FILE_BYTES, fit_budget=True, folder="creative_pack", workers=PACK_WORKERS,
+               progress=None):
+    """
+    Stream a pack of spec in every format into fileobj (a binary file or stream).
+
+    JPEGs are fitted under max_bytes (encoded at quality when fit_budget is
+    off); PNGs are lossless. progress, if given, is called as
+    progress(fraction, message). Returns the manifest that is also stored in
+    the archive as compliance.json.
+    """
+    formats = list(formats or FORMATS)
+    report_progress = progress or (lambda fraction, message="": None)
+    variants = (dataclasses.replace(spec, format=label) for label in formats)
+    manifest = {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "creative": {field: getattr(spec, field) for field in COPY_FIELDS},
+        "files": [],
+    }
+
+    done = 0
+    with ZipFile(fileobj, "w") as zf, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="guardian-pack") as pool:
+        pending = deque()
+        while True:
+            for variant in variants:
+                pending.append((variant, pool.submit(_render_format, variant, image_formats, max_bytes, fit_budget)))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+
+            # Archive order is format order; later formats keep rendering meanwhile
+            variant, future = pending.popleft()
+            canvas, fitted = future.result()
+            manifest["files"].extend(
+                _write_format(zf, folder, variant, canvas, fitted, image_formats, quality, max_bytes))
+            done += 1
+            report_progress(done / len(formats), f"Packed {done}/{len(formats)} formats")
+
+        report = json.dumps(manifest, indent=2).encode("utf-8")
+        _write_entry(zf, f"{folder}/{REPORT_NAME}", report, ZIP_DEFLATED)
+    return manifest
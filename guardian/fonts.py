@@ -0,0 +1,89 @@
+"""
+Font registry.
+
+Fonts ship with the app in guardian/fonts/ so creatives look the same on every
+host (Linux containers have no Arial). Each font file is read once per
+process, and FreeType fonts are cached by (family, size) and shared by all
+sessions. Load failures are logged and kept in load_errors() rather than
+silently swallowed.
+"""
+
+import io
+import logging
+import os
+import threading
+from functools import lru_cache
+
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+# family -> bundled font file
+FAMILIES = {
+    "sans": "DejaVuSans.ttf",
+    "sans-bold": "DejaVuSans-Bold.ttf",
+}
+DEFAULT_FAMILY = "sans-bold"
+
+_errors = {}
+_errors_lock = threading.Lock()
+
+
+class FontLoadError(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def font_bytes(family):
+    """Raw font file for a family, read from disk once per process."""
+    if family not in FAMILIES:
+        raise FontLoadError(f"Unknown font family '{family}' (known: {', '.join(FAMILIES)})")
+    path = os.path.join(FONT_DIR, FAMILIES[family])
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError as e:
+        raise FontLoadError(f"Cannot read font file {path}: {e}") from e
+
+
+@lru_cache(maxsize=512)
+def get_font(family, size):
+    """
+    FreeType font for (family, size).
+
+    If the bundled file cannot be loaded the error is logged, recorded in
+    load_errors() and Pillow's built-in scalable font is used instead.
+    """
+    try:
+        return ImageFont.truetype(io.BytesIO(font_bytes(family)), size)
+    except (FontLoadError, OSError) as e:
+        with _errors_lock:
+            first = family not in _errors
+            _errors[family] = str(e)
+        if first:
+            logger.error("Font '%s' failed to load, using Pillow default: %s", family, e)
+        return ImageFont.load_default(size)
+
+
+def load_errors():
+    """family -> error message for every family that failed to load."""
+    with _errors_lock:
+        return dict(_errors)
+
+
+def preload(families=None):
+    """
+    Read font files up front.
+
+    Called at import time by the app and as the worker initializer of process
+    pools, so forked workers inherit the bytes instead of re-reading them.
+    """
+    for family in families or FAMILIES:
+        try:
+            font_bytes(family)
+        except FontLoadError as e:
+            with _errors_lock:
+                _errors[family] = str(e)
+            logger.error("Font '%s' failed to preload: %s", family, e)
@@ -0,0 +1,141 @@
+"""
+Shared background executor for long-running actions.
+
+Streamlit runs each session's script on its own thread, so a slow action
+(a campaign render, an audit) used to hold that thread behind a spinner.
+Actions are instead submitted here and run on one bounded, process-wide
+thread pool:
+
+    job_id = jobs.submit("audit", run_audit_step, creative)
+    job = jobs.get(job_id)      # poll: job.status, job.progress, job.message
+    if job.done: use(job.result)
+
+The submitted function receives a progress(fraction, message) callback as
+its first argument. Threads (not processes) are used so jobs share the
+in-memory asset, layer and render caches with the sessions that started
+them; the heavy Pillow work releases the GIL. Finished jobs are kept until
+their session collects them with jobs.pop(job_id), or at most
+FINISHED_JOB_SECONDS (and FINISHED_JOBS_KEPT of them) for sessions that
+went away, so results such as packed archives do not pile up.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# Worker threads shared by every session
+JOB_WORKERS = int(os.environ.get("GUARDIAN_JOB_WORKERS", str(min(os.cpu_count() or 1, 8))))
+# Finished jobs kept for collection, and for how long
+FINISHED_JOBS_KEPT = 256
+FINISHED_JOB_SECONDS = 600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    name: str
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def seconds(self):
+        """Run time so far (or in total once finished)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobManager:
+    """A bounded thread pool plus the status of every job submitted to it."""
+
+    def __init__(self, workers=JOB_WORKERS, keep=FINISHED_JOBS_KEPT, max_age=FINISHED_JOB_SECONDS):
+        self.workers = workers
+        self.keep = keep
+        self.max_age = max_age
+        self._pool = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _executor(self):
+        # Created on first use so importing this module starts no threads
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="guardian-job")
+            return self._pool
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Queue fn(progress, *args, **kwargs) and return the job id."""
+        job = Job(id=f"{name}-{next(self._ids)}", name=name)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor().submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        def progress(fraction, message=""):
+            job.progress = min(max(float(fraction), 0.0), 1.0)
+            job.message = message
+
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.result = fn(progress, *args, **kwargs)
+            job.progress, job.status = 1.0, DONE
+        except Exception as e:  # reported to the session through the job, not raised
+            job.error, job.status = f"{type(e).__name__}: {e}", FAILED
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id):
+        """Remove a job (and its result) from the registry once it has been collected."""
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def active(self):
+        """Number of queued or running jobs."""
+        with self._lock:
+            return sum(not job.done for job in self._jobs.values())
+
+    def _prune(self):
+        expired = time.time() - self.max_age
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        excess = max(len(finished) - self.keep, 0)
+        for i, job_id in enumerate(finished):
+            finished_at = self._jobs[job_id].finished
+            if i < excess or (finished_at is not None and finished_at < expired):
+                del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+jobs = JobManager()
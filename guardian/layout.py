@@ -0,0 +1,299 @@
+"""
+Per-format layout engine.
+
+Each format gets a frame of safe zone and element boxes, computed once and
+cached. Text is fitted into its box with font metrics (textbbox): the
+largest size that fits, up to the box height, found by bisection. The size
+fitting a sample text of the same length bucket, cached per
+(format, slot, font family, bucket), is only the starting guess, and the
+fitted block is cached per (text, box, family), so bulk renders of the same
+copy skip the measurements altogether.
+
+Low-resolution proxies (campaign ranking) reuse the full-size layout
+shrunk by scale_layout, so they keep its font sizes, line fitting and
+truncation in proportion instead of being re-fitted at a size where
+integer rounding changes the result.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict
+
+from PIL import Image, ImageDraw
+
+from guardian.fonts import DEFAULT_FAMILY, get_font
+
+# Version of the rendered output. Persisted layers and exports are keyed by
+# spec hash, so bump this whenever a change here, in guardian.render,
+# guardian.background or guardian.encoding changes the pixels or bytes produced
+# for the same spec; guardian.disk_cache then starts a fresh directory.
+RENDER_VERSION = 1
+# Text is never fitted below this size (Tesco minimum legible size)
+MIN_FONT_SIZE = 20
+# Share of the shorter canvas side kept clear around the edges
+SAFE_MARGIN = 0.05
+# Text lengths are grouped into buckets of this many characters
+LENGTH_BUCKET = 8
+
+TEXT_SLOTS = ("headline", "subhead", "value_tile", "tag")
+
+# Representative copy used to measure a length bucket (upper case runs wide)
+_SAMPLE_TEXT = "SUMMER SALE 50% OFF CLUBCARD PRICE AVAILABLE AT TESCO " * 8
+
+_measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+
+@dataclass(frozen=True)
+class Box:
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+
+    @property
+    def width(self):
+        return self.x1 - self.x0
+
+    @property
+    def height(self):
+        return self.y1 - self.y0
+
+    @property
+    def center(self):
+        return ((self.x0 + self.x1) // 2, (self.y0 + self.y1) // 2)
+
+    def inset(self, fraction):
+        dx = int(self.width * fraction)
+        dy = int(self.height * fraction)
+        return Box(self.x0 + dx, self.y0 + dy, self.x1 - dx, self.y1 - dy)
+
+    def contains(self, other):
+        return (self.x0 <= other.x0 and self.y0 <= other.y0
+                and other.x1 <= self.x1 and other.y1 <= self.y1)
+
+    def as_list(self):
+        return [self.x0, self.y0, self.x1, self.y1]
+
+    def scaled(self, scale):
+        return Box(*(int(round(v * scale)) for v in (self.x0, self.y0, self.x1, self.y1)))
+
+
+@dataclass(frozen=True)
+class Frame:
+    """Text-independent geometry of one format."""
+
+    width: int
+    height: int
+    safe_zone: Box
+    product: Box
+    value_tile: Box
+    boxes: Dict[str, Box]  # text box per slot
+
+
+@dataclass(frozen=True)
+class TextBlock:
+    text: str
+    box: Box
+    font_size: int
+    bbox: Box        # measured ink box of the text as drawn
+    truncated: bool  # text had to be cut to fit at MIN_FONT_SIZE
+
+
+@dataclass(frozen=True)
+class Layout:
+    frame: Frame
+    family: str
+    blocks: Dict[str, TextBlock]
+
+
+# ==================== MEASURING ====================
+
+def measure(text, font):
+    """Ink box of text drawn centred on (0, 0) with anchor 'mm'."""
+    return _measure.textbbox((0, 0), text, font=font, anchor="mm")
+
+
+def _fits(text, family, size, box):
+    x0, y0, x1, y1 = measure(text, get_font(family, size))
+    return x1 - x0 <= box.width and y1 - y0 <= box.height
+
+
+# ==================== FRAMES ====================
+
+def _stack(x0, x1, top, rows, unit, gap):
+    """Lay rows of (name, height fraction) top-down between x0 and x1."""
+    boxes = {}
+    y = top
+    for name, fraction in rows:
+        h = int(unit * fraction)
+        boxes[name] = Box(x0, y, x1, y + h)
+        y += h + gap
+    return boxes
+
+
+@lru_cache(maxsize=None)
+def frame_for_size(width, height):
+    """Compute safe zone and element boxes for a canvas size."""
+    margin = max(int(min(width, height) * SAFE_MARGIN), 8)
+    safe = Box(margin, margin, width - margin, height - margin)
+    aspect = height / width
+
+    if aspect >= 0.8:
+        # Square / portrait: tile, headline, subhead on top, product, tag at bottom
+        unit = min(safe.width, safe.height)
+        gap = int(unit * 0.02)
+        top = _stack(safe.x0, safe.x1, safe.y0, [
+            ("tile_row", 0.11), ("headline", 0.09), ("subhead", 0.06)], unit, gap)
+        tag_h = int(unit * 0.04)
+        boxes = {
+            "headline": top["headline"],
+            "subhead": top["subhead"],
+            "tag": Box(safe.x0, safe.y1 - tag_h, safe.x1, safe.y1),
+        }
+        row = top["tile_row"]
+        tile = Box(row.x0, row.y0, row.x0 + int(safe.width * 0.3), row.y1)
+        product = Box(safe.x0, top["subhead"].y1 + gap, safe.x1, safe.y1 - tag_h - gap)
+
+    elif aspect >= 0.4:
+        # Landscape: product column on the left, text column on the right
+        unit = safe.height
+        gap = int(unit * 0.03)
+        split = safe.x0 + int(safe.width * 0.4)
+        col = _stack(split + gap, safe.x1, safe.y0, [
+            ("tile_row", 0.18), ("headline", 0.17), ("subhead", 0.12)], unit, gap)
+        tag_h = int(unit * 0.1)
+        boxes = {
+            "headline": col["headline"],
+            "subhead": col["subhead"],
+            "tag": Box(split + gap, safe.y1 - tag_h, safe.x1, safe.y1),
+        }
+        row = col["tile_row"]
+        tile = Box(row.x0, row.y0, row.x0 + int(row.width * 0.4), row.y1)
+        product = Box(safe.x0, safe.y0, split, safe.y1)
+
+    else:
+        # Banner: tile column, product column, text column
+        unit = safe.height
+        gap = int(unit * 0.05)
+        tile_col = safe.x0 + int(safe.width * 0.22)
+        product_col = tile_col + int(safe.width * 0.24)
+        tile_h = int(unit * 0.45)
+        tile_y = safe.y0 + (safe.height - tile_h) // 2
+        tile = Box(safe.x0, tile_y, tile_col - gap, tile_y + tile_h)
+        product = Box(tile_col, safe.y0, product_col, safe.y1)
+        boxes = _stack(product_col + gap, safe.x1, safe.y0, [
+            ("headline", 0.34), ("subhead", 0.24), ("tag", 0.2)], unit, gap)
+
+    # Value tile text sits inside the tile with some padding
+    boxes["value_tile"] = tile.inset(0.08)
+    return Frame(width, height, safe, product, tile, boxes)
+
+
+# ==================== TEXT FITTING ====================
+
+def length_bucket(text):
+    return (len(text) + LENGTH_BUCKET - 1) // LENGTH_BUCKET
+
+
+def max_font_size(box):
+    """Largest size worth trying in box: text ink is roughly 0.75 of the font size tall."""
+    return max(int(box.height / 0.75), MIN_FONT_SIZE)
+
+
+def _largest_fitting(text, family, box, lo, hi):
+    """Largest size in [lo, hi) given that text fits at lo and not at hi."""
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if _fits(text, family, mid, box):
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+@lru_cache(maxsize=4096)
+def bucket_font_size(width, height, slot, family, bucket):
+    """Largest font size fitting a representative text of this length bucket."""
+    box = frame_for_size(width, height).boxes[slot]
+    sample = _SAMPLE_TEXT[:max(bucket * LENGTH_BUCKET, 1)]
+    cap = max_font_size(box)
+    if _fits(sample, family, cap, box):
+        return cap
+    return _largest_fitting(sample, family, box, MIN_FONT_SIZE, cap)
+
+
+@lru_cache(maxsize=4096)
+def fit_text(text, box, family, start_size):
+    """
+    Fit text into box at the largest size up to max_font_size(box).
+
+    start_size is a guess: the search grows from it when it fits and shrinks
+    from it when it does not. Text that does not fit at MIN_FONT_SIZE is
+    truncated with an ellipsis.
+    """
+    cap = max_font_size(box)
+    size = min(max(start_size, MIN_FONT_SIZE), cap)
+    if _fits(text, family, size, box):
+        if size < cap:
+            size = cap if _fits(text, family, cap, box) else _largest_fitting(text, family, box, size, cap)
+    elif size > MIN_FONT_SIZE and _fits(text, family, MIN_FONT_SIZE, box):
+        size = _largest_fitting(text, family, box, MIN_FONT_SIZE, size)
+    else:
+        size = MIN_FONT_SIZE
+
+    truncated = False
+    if not _fits(text, family, size, box):
+        truncated = True
+        while len(text) > 1 and not _fits(text + "…", family, size, box):
+            text = text[:-1]
+        text = text.rstrip() + "…"
+
+    return TextBlock(text, box, size, _ink_box(text, family, size, box), truncated)
+
+
+def _ink_box(text, family, size, box):
+    x0, y0, x1, y1 = measure(text, get_font(family, size))
+    cx, cy = box.center
+    return Box(cx + x0, cy + y0, cx + x1, cy + y1)
+
+
+def compute_layout(size, texts, family=DEFAULT_FAMILY):
+    """
+    Resolve the layout of a creative.
+
+    size is (width, height); texts maps each slot in TEXT_SLOTS to its copy.
+    """
+    width, height = size
+    frame = frame_for_size(width, height)
+    blocks = {}
+    for slot in TEXT_SLOTS:
+        text = texts.get(slot) or ""
+        if not text:
+            continue
+        start = bucket_font_size(width, height, slot, family, length_bucket(text))
+        blocks[slot] = fit_text(text, frame.boxes[slot], family, start)
+    return Layout(frame, family, blocks)
+
+
+def scale_layout(layout, scale):
+    """
+    A full-size layout shrunk for a proxy of the format size times scale.
+
+    Boxes and font sizes are scaled, not re-fitted; only the ink boxes are
+    measured again at the smaller font size.
+    """
+    frame = layout.frame
+    width, height = max(round(frame.width * scale), 1), max(round(frame.height * scale), 1)
+    small = Frame(
+        width, height,
+        frame.safe_zone.scaled(scale),
+        frame.product.scaled(scale),
+        frame.value_tile.scaled(scale),
+        {slot: box.scaled(scale) for slot, box in frame.boxes.items()},
+    )
+    blocks = {}
+    for slot, block in layout.blocks.items():
+        box = small.boxes[slot]
+        size = max(int(round(block.font_size * scale)), 1)
+        blocks[slot] = TextBlock(block.text, box, size, _ink_box(block.text, layout.family, size, box), block.truncated)
+    return Layout(small, layout.family, blocks)
@@ -0,0 +1,231 @@
+"""
+In-process metrics: counters and latency histograms.
+
+    from guardian.metrics import timed, counter
+
+    with timed("render", format=spec.format):
+        canvas = compose(spec)
+    counter("guardian_render_cache_total").inc(result="hit")
+
+Every render, encode, compliance check, audit and upload decode is timed
+into a histogram named guardian_<stage>_seconds. Histograms keep
+Prometheus-style cumulative buckets (exported by render_text(), served as
+GET /metrics by guardian.api and by start_http_server() in the Streamlit
+process) plus a bounded window of recent samples for the p50/p95 and
+throughput shown on the dashboard.
+
+Metrics are per process: each API worker and the UI server report their
+own series, labelled with their pid.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Recent samples kept per series for quantiles and rates
+WINDOW_SAMPLES = 2048
+
+
+def _label_value(value):
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, _label_value(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Sum over every series matching the given labels."""
+        want = set(_label_key(labels))
+        with self._lock:
+            return sum(v for key, v in self._values.items() if want <= set(key))
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class _Series:
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=WINDOW_SAMPLES)  # (timestamp, value)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets)
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.sum += value
+            series.count += 1
+            series.recent.append((time.time(), value))
+
+    def _matching(self, labels):
+        want = set(_label_key(labels))
+        return [s for key, s in self._series.items() if want <= set(key)]
+
+    def count(self, **labels):
+        with self._lock:
+            return sum(s.count for s in self._matching(labels))
+
+    def quantile(self, q, **labels):
+        """q-quantile of the recent window (None before any observation)."""
+        with self._lock:
+            values = sorted(v for s in self._matching(labels) for _, v in s.recent)
+        if not values:
+            return None
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    def rate(self, window=60.0, **labels):
+        """Observations per second over the last window seconds."""
+        since = time.time() - window
+        with self._lock:
+            n = sum(1 for s in self._matching(labels) for t, _ in s.recent if t >= since)
+        return n / window
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, s in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip((*self.buckets, "+Inf"), s.counts):
+                    cumulative += n
+                    out.append((f"{self.name}_bucket", key + (("le", str(bound)),), cumulative))
+                out.append((f"{self.name}_sum", key, s.sum))
+                out.append((f"{self.name}_count", key, s.count))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, cls, name, help=""):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.kind}")
+            return metric
+
+    def render_text(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        pid = (("pid", str(os.getpid())),)
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample, key, value in metric.samples():
+                lines.append(f"{sample}{_format_labels(key, pid)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help=""):
+    return REGISTRY.get_or_create(Counter, name, help)
+
+
+def histogram(name, help=""):
+    return REGISTRY.get_or_create(Histogram, name, help)
+
+
+def stage_histogram(stage):
+    return histogram(f"guardian_{stage}_seconds", f"Latency of {stage} in seconds")
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Time the block into guardian_<stage>_seconds (errors are counted too)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        counter(f"guardian_{stage}_errors_total", f"Failed {stage} calls").inc(**labels)
+        raise
+    finally:
+        stage_histogram(stage).observe(time.perf_counter() - start, **labels)
+
+
+def render_text():
+    return REGISTRY.render_text()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would drown the log
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve GET /metrics from this process on a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="guardian-metrics", daemon=True).start()
+    logger.info("Serving metrics on %s:%d/metrics", host, server.server_port)
+    return server
@@ -0,0 +1,141 @@
+"""
+Colour palette suggestions from the product image.
+
+The product is downsampled to a few thousand pixels and clustered with a
+vectorized k-means (deterministic k-means++ seeding). From the dominant
+colours we propose a background tint and primary/secondary accents: the
+background is lightened until both Tesco red and Tesco blue text pass WCAG
+contrast on it, and accents are darkened until they stand out from that
+background as large-text/graphics contrast. Palettes are cached per asset
+hash, so the extraction can run on every upload for a few milliseconds.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from PIL import ImageColor
+
+from guardian.cache import LRUCache
+from guardian.compliance import CONTRAST_LARGE, CONTRAST_NORMAL, contrast_ratio, relative_luminance
+from guardian.render import BRAND_BLUE, BRAND_RED
+
+# Clustering runs on a copy no larger than this
+SAMPLE_SIDE = 64
+CLUSTERS = 5
+ITERATIONS = 8
+# Clusters with a smaller channel spread are greys (usually the studio backdrop)
+MIN_ACCENT_SPREAD = 40
+PALETTE_CACHE_SIZE = int(os.environ.get("GUARDIAN_PALETTE_CACHE_SIZE", "256"))
+
+_palettes = LRUCache(PALETTE_CACHE_SIZE)
+
+
+@dataclass(frozen=True)
+class Palette:
+    dominant: List[str]   # cluster centres, most common first
+    shares: List[float]   # share of pixels per dominant colour
+    background: str
+    primary: str
+    secondary: str
+
+
+def to_hex(rgb):
+    r, g, b = (int(round(c)) for c in rgb)
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+
+def kmeans(pixels, k=CLUSTERS, iterations=ITERATIONS, seed=0):
+    """Cluster an (n, 3) float array; returns (centres, counts) sorted by count."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(pixels))
+
+    # k-means++ seeding
+    centres = [pixels[rng.integers(len(pixels))]]
+    for _ in range(1, k):
+        d2 = ((pixels[:, None, :] - np.array(centres)[None]) ** 2).sum(-1).min(axis=1)
+        if d2.sum() == 0:
+            break
+        centres.append(pixels[rng.choice(len(pixels), p=d2 / d2.sum())])
+    centres = np.array(centres)
+
+    for _ in range(iterations):
+        labels = ((pixels[:, None, :] - centres[None]) ** 2).sum(-1).argmin(axis=1)
+        counts = np.bincount(labels, minlength=len(centres))
+        sums = np.zeros_like(centres)
+        np.add.at(sums, labels, pixels)
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centres)
+        if np.allclose(moved, centres, atol=0.5):
+            centres = moved
+            break
+        centres = moved
+
+    labels = ((pixels[:, None, :] - centres[None]) ** 2).sum(-1).argmin(axis=1)
+    counts = np.bincount(labels, minlength=len(centres))
+    order = np.argsort(-counts)
+    return centres[order], counts[order]
+
+
+def _luminance(rgb):
+    return float(relative_luminance(np.clip(np.round(rgb), 0, 255).astype(np.uint8)))
+
+
+def _passes_brand_text(rgb):
+    l = _luminance(rgb)
+    return all(
+        contrast_ratio(l, _luminance(ImageColor.getrgb(brand))) >= CONTRAST_NORMAL
+        for brand in (BRAND_RED, BRAND_BLUE)
+    )
+
+
+def background_tint(rgb):
+    """Lighten a colour towards white until brand red and blue text pass on it."""
+    rgb = np.asarray(rgb, dtype=float)
+    for t in np.linspace(0, 1, 21):
+        tint = rgb + (255 - rgb) * t
+        if _passes_brand_text(tint):
+            return tint
+    return np.array([255.0, 255.0, 255.0])
+
+
+def accent_shade(rgb, background):
+    """Darken a colour towards black until it stands out from the background."""
+    rgb = np.asarray(rgb, dtype=float)
+    bg_l = _luminance(background)
+    for t in np.linspace(0, 1, 21):
+        shade = rgb * (1 - t)
+        if contrast_ratio(_luminance(shade), bg_l) >= CONTRAST_LARGE:
+            return shade
+    return np.zeros(3)
+
+
+def extract_palette(image, k=CLUSTERS):
+    """Palette for a PIL image."""
+    small = image.convert("RGB")
+    small.thumbnail((SAMPLE_SIDE, SAMPLE_SIDE))
+    pixels = np.asarray(small, dtype=float).reshape(-1, 3)
+    centres, counts = kmeans(pixels, k)
+
+    spread = centres.max(axis=1) - centres.min(axis=1)
+    accents = [c for c, s in zip(centres, spread) if s >= MIN_ACCENT_SPREAD] or list(centres)
+    primary = accents[0]
+    secondary = accents[1] if len(accents) > 1 else primary * 0.6
+    background = background_tint(primary)
+
+    return Palette(
+        dominant=[to_hex(c) for c in centres],
+        shares=[round(float(c), 3) for c in counts / counts.sum()],
+        background=to_hex(background),
+        primary=to_hex(accent_shade(primary, background)),
+        secondary=to_hex(accent_shade(secondary, background)),
+    )
+
+
+def palette_for(asset):
+    """Cached palette for a ProductAsset (keyed by its content hash and edits)."""
+    palette = _palettes.get(asset.digest)
+    if palette is None:
+        palette = extract_palette(asset.fit(SAMPLE_SIDE, SAMPLE_SIDE))
+        _palettes.put(asset.digest, palette)
+    return palette
@@ -0,0 +1,288 @@
+"""
+Headless creative render engine.
+
+A creative is described by a declarative CreativeSpec and rendered with
+render_creative(). Results are memoized in an LRU keyed by a content hash of
+the spec, so Streamlit reruns that ask for the same creative skip the Pillow
+pipeline entirely.
+
+Creatives are composited from cached RGBA layers rather than drawn in one
+pass. The product tile (fitted, with its cut-out mask), the value tile and
+each text block are rasterized separately and keyed by exactly the inputs
+that affect them; background, product and value tile are flattened into a
+cached base plate. Editing one text field therefore re-rasterizes only that
+block and alpha_composites the text tiles onto a copy of the plate. Layers
+are also kept in guardian.disk_cache, so they survive restarts and are
+shared by every worker process.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageDraw
+
+from guardian.assets import ProductAsset
+from guardian.background import product_mask
+from guardian.cache import LRUCache
+from guardian.disk_cache import disk_cache
+from guardian.fonts import get_font
+from guardian.layout import compute_layout, scale_layout
+from guardian.metrics import counter, timed
+
+# Tesco brand colours
+BRAND_RED = "#DA291C"
+BRAND_BLUE = "#00539F"
+
+# Output formats offered in the Design tab: label -> (width, height)
+FORMATS = {
+    "Instagram Square (1080x1080)": (1080, 1080),
+    "Instagram Story (1080x1920)": (1080, 1920),
+    "Facebook Post (1200x630)": (1200, 630),
+    "Display Banner (970x250)": (970, 250),
+}
+DEFAULT_FORMAT = "Instagram Square (1080x1080)"
+
+# CreativeSpec text fields a campaign fills in, and the copy used when none is given
+COPY_FIELDS = ("headline", "subhead", "value_tile", "tag", "background")
+DEFAULT_COPY = {
+    "headline": "SUMMER SALE - 50% OFF",
+    "subhead": "Clubcard members save even more",
+    "value_tile": "Clubcard Price",
+    "tag": "Available at Tesco",
+    "background": "#FFFFFF",
+}
+
+# Number of rendered creatives kept in memory per process, and their memory ceiling
+RENDER_CACHE_SIZE = int(os.environ.get("GUARDIAN_RENDER_CACHE_SIZE", "32"))
+RENDER_CACHE_MB = int(os.environ.get("GUARDIAN_RENDER_CACHE_MB", "64"))
+# Number of product/value tile/text tiles and of base plates kept per process,
+# and their memory ceilings
+LAYER_CACHE_SIZE = int(os.environ.get("GUARDIAN_LAYER_CACHE_SIZE", "256"))
+LAYER_CACHE_MB = int(os.environ.get("GUARDIAN_LAYER_CACHE_MB", "64"))
+PLATE_CACHE_SIZE = int(os.environ.get("GUARDIAN_PLATE_CACHE_SIZE", "8"))
+PLATE_CACHE_MB = int(os.environ.get("GUARDIAN_PLATE_CACHE_MB", "32"))
+
+
+def format_slug(label):
+    """'Instagram Square (1080x1080)' -> 'instagram-square'"""
+    return label.split("(")[0].strip().lower().replace(" ", "-")
+
+
+@dataclass(frozen=True)
+class CreativeSpec:
+    """
+    Everything needed to render one creative.
+
+    product may be given as a ProductAsset or a plain PIL image (wrapped
+    into an asset on construction). scale renders a proportionally smaller
+    proxy of the format, e.g. 0.25 for campaign ranking.
+    """
+
+    product: Optional[ProductAsset] = None
+    background: str = "#FFFFFF"
+    headline: str = ""
+    subhead: str = ""
+    value_tile: str = "Clubcard Price"
+    tag: str = "Available at Tesco"
+    format: str = DEFAULT_FORMAT
+    remove_background: bool = False
+    scale: float = 1.0
+
+    def __post_init__(self):
+        if isinstance(self.product, Image.Image):
+            object.__setattr__(self, "product", ProductAsset.from_image(self.product))
+
+    @property
+    def size(self):
+        width, height = FORMATS[self.format]
+        if self.scale == 1.0:
+            return width, height
+        return max(round(width * self.scale), 1), max(round(height * self.scale), 1)
+
+    def cache_key(self):
+        """Content hash of the spec (product content and edits included)."""
+        fields = {
+            "background": self.background,
+            "headline": self.headline,
+            "subhead": self.subhead,
+            "value_tile": self.value_tile,
+            "tag": self.tag,
+            "format": self.format,
+            "remove_background": self.remove_background,
+            "scale": self.scale,
+            "product": self.product.digest if self.product is not None else None,
+        }
+        payload = json.dumps(fields, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+
+# ==================== RENDER CACHE ====================
+
+_render_cache = LRUCache(RENDER_CACHE_SIZE, RENDER_CACHE_MB * 1024 * 1024)
+
+
+def render_creative(spec, use_cache=True):
+    """
+    Render a creative and return it as an RGB PIL image.
+
+    The returned image is shared through the render cache - treat it as
+    read-only and .copy() it before drawing on it. Batch jobs that never
+    repeat a spec pass use_cache=False to skip hashing and caching.
+    Proxy renders are labelled proxy="true" in the metrics.
+    """
+    proxy = spec.scale != 1.0
+    if not use_cache:
+        with timed("render", format=spec.format, proxy=proxy):
+            return _compose(spec)
+
+    key = spec.cache_key()
+    canvas = _render_cache.get(key)
+    lookups = counter("guardian_render_cache_total", "Render cache lookups by result")
+    if canvas is None:
+        lookups.inc(result="miss", proxy=proxy)
+        with timed("render", format=spec.format, proxy=proxy):
+            canvas = _compose(spec)
+        _render_cache.put(key, canvas)
+    else:
+        lookups.inc(result="hit", proxy=proxy)
+    return canvas
+
+
+def clear_render_cache():
+    _render_cache.clear()
+    _layers.clear()
+    _plates.clear()
+
+
+# ==================== COMPOSITION ====================
+
+TEXT_COLOURS = {
+    "headline": BRAND_RED,
+    "subhead": BRAND_BLUE,
+    "tag": "#000000",
+    "value_tile": "white",
+}
+
+
+def layout_for(spec, full_size=False):
+    """
+    Resolved layout (boxes and fitted font sizes) for a spec.
+
+    Proxies get the full-size layout shrunk to spec.scale, unless full_size.
+    """
+    layout = compute_layout(FORMATS[spec.format], {
+        "headline": spec.headline,
+        "subhead": spec.subhead,
+        "value_tile": spec.value_tile,
+        "tag": spec.tag,
+    })
+    if full_size or spec.scale == 1.0:
+        return layout
+    return scale_layout(layout, spec.scale)
+
+
+# ==================== LAYERS ====================
+
+# Tiles are (RGBA image, (x, y) position on the canvas)
+_layers = LRUCache(LAYER_CACHE_SIZE, LAYER_CACHE_MB * 1024 * 1024)
+# Full-canvas RGBA plates of background + product + value tile
+_plates = LRUCache(PLATE_CACHE_SIZE, PLATE_CACHE_MB * 1024 * 1024)
+
+
+def _cached(cache, key, build):
+    layer = cache.get(key)
+    if layer is None:
+        layer = build()
+        cache.put(key, layer)
+    return layer
+
+
+def _layer(key, build):
+    """A layer tile from memory, then the disk cache, then build()."""
+    def load():
+        tile = disk_cache.get_image("layer", key)
+        if tile is not None:
+            return tile, tuple(tile.info["position"])
+        tile, position = build()
+        disk_cache.put_image("layer", key, tile, position=list(position))
+        return tile, position
+
+    return _cached(_layers, key, load)
+
+
+def product_layer(product, box, remove_background):
+    """The fitted product as an RGBA tile centred in box."""
+    def build():
+        fitted = product.fit(box.width, box.height)
+        tile = fitted.convert("RGBA")
+        if remove_background:
+            tile.putalpha(product_mask(product, fitted.size))
+        x = box.x0 + (box.width - tile.width) // 2
+        y = box.y0 + (box.height - tile.height) // 2
+        return tile, (x, y)
+
+    return _layer(("product", product.digest, box, remove_background), build)
+
+
+def value_tile_layer(box, outline):
+    """The red value tile rectangle."""
+    def build():
+        tile = Image.new("RGBA", (box.width + 1, box.height + 1), (0, 0, 0, 0))
+        ImageDraw.Draw(tile).rectangle([0, 0, box.width, box.height], fill=BRAND_RED,
+                                       outline="#000000", width=outline)
+        return tile, (box.x0, box.y0)
+
+    return _layer(("value_tile", box, outline), build)
+
+
+def text_layer(block, family, colour):
+    """One text block cropped to its ink box."""
+    def build():
+        x0, y0 = int(block.bbox.x0) - 1, int(block.bbox.y0) - 1
+        x1, y1 = int(block.bbox.x1) + 2, int(block.bbox.y1) + 2
+        # Antialiasing coverage goes into the alpha channel of a solid colour
+        # tile, so edges blend like text drawn straight onto the canvas
+        coverage = Image.new("L", (x1 - x0, y1 - y0), 0)
+        cx, cy = block.box.center
+        font = get_font(family, block.font_size)
+        ImageDraw.Draw(coverage).text((cx - x0, cy - y0), block.text, fill=255, font=font, anchor="mm")
+        tile = Image.new("RGBA", coverage.size, colour)
+        tile.putalpha(coverage)
+        return tile, (x0, y0)
+
+    key = ("text", block.text, block.box, block.font_size, family, colour)
+    return _layer(key, build)
+
+
+def _plate(spec, layout):
+    """Background, product and value tile flattened into one RGBA canvas."""
+    frame = layout.frame
+    has_tile = "value_tile" in layout.blocks
+    product = spec.product.digest if spec.product is not None else None
+
+    def build():
+        plate = Image.new("RGBA", spec.size, spec.background)
+        tiles = []
+        if spec.product is not None:
+            tiles.append(product_layer(spec.product, frame.product, spec.remove_background))
+        if has_tile:
+            width, height = spec.size
+            tiles.append(value_tile_layer(frame.value_tile, max(min(width, height) // 400, 1)))
+        for tile, position in tiles:
+            plate.alpha_composite(tile, dest=position)
+        return plate
+
+    key = (spec.size, spec.background, product, spec.remove_background, has_tile)
+    return _cached(_plates, key, build)
+
+
+def _compose(spec):
+    layout = layout_for(spec)
+    canvas = _plate(spec, layout).copy()
+    for slot, block in layout.blocks.items():
+        tile, position = text_layer(block, layout.family, TEXT_COLOURS[slot])
+        canvas.alpha_composite(tile, dest=position)
+    return canvas.convert("RGB")
@@ -0,0 +1,9 @@
+"""Run with: python -m pytest tests"""
+
+import os
+import sys
+
+# Tests must neither read nor leave entries in the shared on-disk cache
+os.environ["GUARDIAN_CACHE_DIR"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from guardian.api import ApiError, int_field, max_bytes_field, render_request, resolve_format, spec_from_request
+from guardian.render import DEFAULT_COPY
+
+
+@pytest.fixture(scope="module")
+def image_b64():
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240), (30, 120, 60)).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def status_of(call, *args):
+    with pytest.raises(ApiError) as info:
+        call(*args)
+    return info.value.status
+
+
+@pytest.mark.parametrize("value,expected", [(None, 85), (90, 90), ("70", 70)])
+def test_int_field_accepts_integers(value, expected):
+    assert int_field({"quality": value}, "quality", 85, 1, 100) == expected
+
+
+@pytest.mark.parametrize("value", ["high", 12.5, True, [90], 0, 101])
+def test_int_field_rejects_everything_else_with_400(value):
+    assert status_of(int_field, {"quality": value}, "quality", 85, 1, 100) == 400
+
+
+def test_max_kb_is_converted_to_bytes():
+    assert max_bytes_field({"max_kb": 200}) == 200 * 1024
+    assert max_bytes_field({}) is None
+    assert status_of(max_bytes_field, {"max_kb": "lots"}) == 400
+
+
+def test_resolve_format_accepts_labels_and_slugs():
+    assert resolve_format("instagram-story") == "Instagram Story (1080x1920)"
+    assert resolve_format("Display Banner (970x250)") == "Display Banner (970x250)"
+    assert status_of(resolve_format, "billboard") == 400
+
+
+def test_null_copy_fields_take_the_defaults(image_b64):
+    spec = spec_from_request({"image": image_b64, "headline": None, "tag": "Only at Tesco"})
+    assert spec.headline == DEFAULT_COPY["headline"]
+    assert spec.tag == "Only at Tesco"
+
+
+@pytest.mark.parametrize("body", [
+    {"headline": 5},
+    {"subhead": ["a"]},
+    {"remove_background": "yes"},
+    {"image": "not base64!"},
+    {"image": base64.b64encode(b"not an image").decode("ascii")},
+])
+def test_invalid_fields_are_rejected_with_400(image_b64, body):
+    assert status_of(spec_from_request, {"image": image_b64, **body}) == 400
+
+
+def test_missing_image_is_rejected(image_b64):
+    assert status_of(spec_from_request, {"headline": "Hi"}) == 400
+    assert spec_from_request({"headline": "Hi"}, shared_image=image_b64).headline == "Hi"
+
+
+def test_file_size_check_uses_the_requested_budget(image_b64):
+    def file_size_check(body):
+        response, _ = render_request({"image": image_b64, "image_format": "PNG", **body})
+        return next(c for c in response["compliance"]["checks"] if c["name"].startswith("File Size"))
+
+    assert file_size_check({})["passed"]
+    assert not file_size_check({"max_kb": 1})["passed"]
@@ -0,0 +1,62 @@
+from collections import deque
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from guardian.background import flood_from_border, segment
+
+
+def reference_flood(candidate):
+    """Plain breadth-first flood fill from the border (4-neighbourhood)."""
+    h, w = candidate.shape
+    reached = np.zeros_like(candidate)
+    queue = deque((y, x) for y in range(h) for x in range(w)
+                  if (y in (0, h - 1) or x in (0, w - 1)) and candidate[y, x])
+    for y, x in queue:
+        reached[y, x] = True
+    while queue:
+        y, x = queue.popleft()
+        for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+            if 0 <= ny < h and 0 <= nx < w and candidate[ny, nx] and not reached[ny, nx]:
+                reached[ny, nx] = True
+                queue.append((ny, nx))
+    return reached
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_flood_matches_breadth_first_search(seed):
+    candidate = np.random.default_rng(seed).random((37, 53)) < 0.6
+    np.testing.assert_array_equal(flood_from_border(candidate), reference_flood(candidate))
+
+
+def test_flood_follows_a_spiral():
+    # A corridor that winds inward needs many alternating sweeps
+    candidate = np.zeros((21, 21), dtype=bool)
+    image = Image.fromarray(candidate.astype(np.uint8) * 255)
+    draw = ImageDraw.Draw(image)
+    draw.line([(0, 1), (19, 1), (19, 19), (1, 19), (1, 3), (17, 3), (17, 17), (3, 17), (3, 5), (15, 5)], fill=255)
+    candidate = np.asarray(image) > 0
+    np.testing.assert_array_equal(flood_from_border(candidate), reference_flood(candidate))
+    assert flood_from_border(candidate)[5, 15]
+
+
+def test_enclosed_backdrop_is_product():
+    candidate = np.ones((20, 20), dtype=bool)
+    candidate[5, 5:15] = candidate[14, 5:15] = candidate[5:15, 5] = candidate[5:15, 14] = False
+    reached = flood_from_border(candidate)
+    assert reached[0, 0] and not reached[10, 10]
+
+
+def test_segment_cuts_out_a_product_on_white():
+    image = Image.new("RGB", (200, 160), "white")
+    ImageDraw.Draw(image).ellipse([50, 30, 150, 130], fill=(200, 30, 40))
+    mask = np.asarray(segment(image))
+    assert mask.shape == (160, 200)
+    assert mask[80, 100] == 255
+    assert mask[0, 0] == 0 and mask[150, 190] == 0
+
+
+def test_segment_keeps_images_without_a_product_opaque():
+    mask = segment(Image.new("RGB", (64, 64), (240, 240, 240)))
+    assert np.asarray(mask).min() == 255
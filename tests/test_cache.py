@@ -0,0 +1,49 @@
+from PIL import Image
+
+from guardian.cache import LRUCache, nbytes
+
+
+def test_nbytes_counts_pixels_and_buffers():
+    assert nbytes(Image.new("RGBA", (10, 20))) == 800
+    assert nbytes(Image.new("L", (10, 20))) == 200
+    assert nbytes((Image.new("RGB", (4, 4)), (1, 2))) == 48
+    assert nbytes(b"abc") == 3
+    assert nbytes(memoryview(b"abcd")) == 4
+
+
+def test_entry_count_bound():
+    cache = LRUCache(2)
+    for key in "abc":
+        cache.put(key, key)
+    assert cache.get("a") is None
+    assert cache.get("b") == "b" and cache.get("c") == "c"
+
+
+def test_byte_bound_evicts_least_recently_used():
+    cache = LRUCache(100, max_bytes=250)
+    for key in "abc":
+        cache.put(key, b"x" * 100)
+    assert cache.get("a") is None
+    assert cache.nbytes == 200
+
+    cache.get("b")
+    cache.put("d", b"x" * 100)
+    assert cache.get("c") is None
+    assert cache.get("b") is not None
+
+
+def test_replacing_a_value_updates_the_total():
+    cache = LRUCache(10, max_bytes=1000)
+    cache.put("a", b"x" * 300)
+    cache.put("a", b"x" * 100)
+    assert cache.nbytes == 100
+    cache.clear()
+    assert cache.nbytes == 0 and len(cache) == 0
+
+
+def test_an_oversized_value_is_still_kept():
+    cache = LRUCache(10, max_bytes=100)
+    cache.put("small", b"x" * 50)
+    cache.put("big", b"x" * 500)
+    assert cache.get("big") is not None
+    assert cache.get("small") is None
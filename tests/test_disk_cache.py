@@ -0,0 +1,124 @@
+import os
+
+import pytest
+from PIL import Image
+
+from guardian import disk_cache as disk_cache_module
+from guardian.disk_cache import MMAP_MIN_BYTES, DiskCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / "cache"), 1024 * 1024)
+
+
+def entry_files(cache):
+    return [path for _, path in cache._paths()]
+
+
+def test_root_is_private(cache):
+    assert cache.enabled
+    assert os.stat(cache.root).st_mode & 0o777 == 0o700
+
+
+def test_refuses_a_root_owned_by_someone_else(tmp_path, monkeypatch):
+    root = tmp_path / "cache"
+    root.mkdir()
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(root).st_uid + 1, raising=False)
+    assert not DiskCache(str(root), 1024).enabled
+
+
+def test_empty_root_disables_the_cache():
+    cache = DiskCache("", 1024)
+    cache.put("ns", "key", b"data")
+    assert cache.get("ns", "key") is None
+
+
+@pytest.mark.parametrize("size", [10, MMAP_MIN_BYTES + 10])
+def test_round_trip(cache, size):
+    payload = os.urandom(size)
+    cache.put("ns", ("key", 1), payload, {"quality": 80})
+    entry = cache.get("ns", ("key", 1))
+    assert bytes(entry.view) == payload
+    assert entry.meta == {"quality": 80}
+    assert cache.get("ns", ("key", 2)) is None
+
+
+def test_image_round_trip_keeps_metadata(cache):
+    image = Image.new("RGBA", (30, 20), (10, 20, 30, 40))
+    cache.put_image("layer", "tile", image, position=[3, 4])
+    loaded = cache.get_image("layer", "tile")
+    assert loaded.mode == "RGBA" and loaded.size == (30, 20)
+    assert loaded.tobytes() == image.tobytes()
+    assert loaded.info["position"] == [3, 4]
+
+
+def test_writes_leave_no_temporary_files(cache):
+    cache.put("ns", "key", b"x" * 1000)
+    names = [os.path.basename(path) for path in entry_files(cache)]
+    assert len(names) == 1
+    assert not names[0].startswith(disk_cache_module._TEMP_PREFIX)
+
+
+def test_existing_entries_are_not_rewritten(cache):
+    cache.put("ns", "key", b"first")
+    cache.put("ns", "key", b"second")
+    assert bytes(cache.get("ns", "key").view) == b"first"
+
+
+def test_failed_write_leaves_nothing_behind(cache, monkeypatch):
+    def fail(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "replace", fail)
+    cache.put("ns", "key", b"data")
+    assert cache.errors == 1
+    assert entry_files(cache) == []
+
+
+def test_corrupt_entry_is_removed_and_rewritten(cache):
+    cache.put("ns", "key", b"y" * 500)
+    path = cache.path("ns", "key")
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 100)
+
+    assert cache.get("ns", "key") is None
+    assert not os.path.exists(path)
+    cache.put("ns", "key", b"z" * 500)
+    assert bytes(cache.get("ns", "key").view) == b"z" * 500
+
+
+def test_transient_read_error_keeps_the_entry(cache, monkeypatch):
+    cache.put("ns", "key", b"data")
+
+    def denied(path):
+        raise PermissionError("busy")
+    monkeypatch.setattr(cache, "_read", denied)
+    assert cache.get("ns", "key") is None
+    assert os.path.exists(cache.path("ns", "key"))
+
+
+def test_trim_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), 10_000)
+    for i in range(8):
+        cache.put("ns", i, b"x" * 2000)
+        path = cache.path("ns", i)
+        os.utime(path, (1000 + i, 1000 + i))
+    cache.trim()
+    assert sum(os.path.getsize(path) for path in entry_files(cache)) <= 10_000
+    assert cache.get("ns", 0) is None
+    assert cache.get("ns", 7) is not None
+
+
+def test_trim_and_clear_only_touch_version_directories(cache):
+    foreign = os.path.join(cache.root, "notes.txt")
+    other = os.path.join(cache.root, "other", "data.bin")
+    os.makedirs(os.path.dirname(other))
+    for path in (foreign, other):
+        with open(path, "wb") as f:
+            f.write(b"x" * 4096)
+
+    cache.max_bytes = 0
+    cache.put("ns", "key", b"data")
+    cache.clear()
+    assert entry_files(cache) == []
+    assert os.path.exists(foreign) and os.path.exists(other)
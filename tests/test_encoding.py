@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from guardian.encoding import SUBSAMPLING_420, _encode, encode_to_budget
+
+
+@pytest.fixture(scope="module")
+def photo():
+    # Smooth gradients plus noise: file size grows steadily with quality
+    rng = np.random.default_rng(7)
+    y, x = np.mgrid[0:480, 0:640]
+    base = np.stack([x / 640 * 255, y / 480 * 255, (x + y) / 1120 * 255], axis=-1)
+    noise = rng.normal(0, 12, base.shape)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), "RGB")
+
+
+@pytest.mark.parametrize("budget", [30_000, 60_000, 120_000])
+def test_picks_the_highest_quality_under_budget(photo, budget):
+    result = encode_to_budget(photo, budget, tolerance=0.0, subsampling=SUBSAMPLING_420)
+    assert result.fits
+    assert result.size <= budget
+    if result.quality < 95:
+        over = _encode(photo, io.BytesIO(), result.quality + 1, result.subsampling, result.progressive)
+        assert over > budget
+
+
+def test_result_is_a_decodable_jpeg(photo):
+    result = encode_to_budget(photo, 60_000)
+    with Image.open(io.BytesIO(result.data)) as decoded:
+        assert decoded.format == "JPEG"
+        assert decoded.size == photo.size
+
+
+def test_stops_early_inside_the_tolerance(photo):
+    exact = encode_to_budget(photo, 60_000, tolerance=0.0, subsampling=SUBSAMPLING_420)
+    loose = encode_to_budget(photo, 60_000, tolerance=0.5, subsampling=SUBSAMPLING_420)
+    assert loose.fits and loose.size >= 30_000
+    assert loose.attempts <= exact.attempts
+
+
+def test_reports_an_unreachable_budget(photo):
+    result = encode_to_budget(photo, 500, min_quality=30)
+    assert not result.fits
+    assert result.quality == 30
+    assert result.size > 500
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from guardian.jobs import DONE, FAILED, JobManager
+
+
+@pytest.fixture
+def manager():
+    jobs = JobManager(workers=2, keep=3, max_age=600)
+    yield jobs
+    jobs.shutdown()
+
+
+def wait(jobs, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs._jobs.get(job_id)
+        if job is not None and job.done:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} did not finish")
+
+
+def test_result_progress_and_failure(manager):
+    def work(progress, x):
+        progress(0.5, "half")
+        return x * 2
+
+    def broken(progress):
+        raise ValueError("bad input")
+
+    ok = wait(manager, manager.submit("double", work, 21))
+    assert ok.status == DONE and ok.result == 42 and ok.progress == 1.0
+    failed = wait(manager, manager.submit("broken", broken))
+    assert failed.status == FAILED and failed.error == "ValueError: bad input"
+
+
+def test_pop_removes_a_collected_job(manager):
+    job_id = manager.submit("noop", lambda progress: "result")
+    wait(manager, job_id)
+    assert manager.pop(job_id).result == "result"
+    assert manager.get(job_id) is None
+
+
+def test_only_the_newest_finished_jobs_are_kept(manager):
+    ids = [manager.submit("noop", lambda progress: None) for _ in range(5)]
+    for job_id in ids:
+        wait(manager, job_id)
+    assert [manager.get(job_id) is not None for job_id in ids] == [False, False, True, True, True]
+
+
+def test_old_finished_jobs_expire(manager):
+    old, new = (manager.submit("noop", lambda progress: None) for _ in range(2))
+    wait(manager, old).finished -= 601
+    wait(manager, new)
+    assert manager.get(old) is None
+    assert manager.get(new) is not None
+
+
+def test_running_jobs_are_never_pruned():
+    jobs = JobManager(workers=1, keep=0, max_age=0)
+    started = []
+
+    def slow(progress):
+        started.append(True)
+        time.sleep(0.2)
+
+    job_id = jobs.submit("slow", slow)
+    while not started:
+        time.sleep(0.01)
+    assert jobs.get(job_id) is not None
+    assert jobs.active() == 1
+    jobs.shutdown()
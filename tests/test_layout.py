@@ -0,0 +1,56 @@
+import pytest
+
+from guardian.fonts import DEFAULT_FAMILY
+from guardian.layout import MIN_FONT_SIZE, Box, _fits, compute_layout, fit_text, max_font_size
+from guardian.render import FORMATS
+
+BOX = Box(0, 0, 400, 60)
+
+
+def assert_largest(block, family=DEFAULT_FAMILY):
+    assert _fits(block.text, family, block.font_size, block.box)
+    if block.font_size < max_font_size(block.box):
+        assert not _fits(block.text, family, block.font_size + 1, block.box)
+
+
+@pytest.mark.parametrize("text", ["New", "Price Lock", "Clubcard Price", "Available at Tesco"])
+def test_fit_text_grows_past_a_small_guess(text):
+    block = fit_text(text, BOX, DEFAULT_FAMILY, MIN_FONT_SIZE)
+    assert not block.truncated
+    assert_largest(block)
+
+
+def test_fit_text_shrinks_a_large_guess():
+    text = "Summer sale on everything in store"
+    block = fit_text(text, BOX, DEFAULT_FAMILY, max_font_size(BOX))
+    assert block.font_size < max_font_size(BOX)
+    assert_largest(block)
+
+
+def test_fit_text_result_does_not_depend_on_the_guess():
+    sizes = {fit_text("Reduced", BOX, DEFAULT_FAMILY, start).font_size for start in (1, 20, 35, 80, 500)}
+    assert len(sizes) == 1
+
+
+def test_fit_text_truncates_below_min_size():
+    box = Box(0, 0, 120, 40)
+    block = fit_text("A headline far too long for a tiny box", box, DEFAULT_FAMILY, 30)
+    assert block.truncated
+    assert block.font_size == MIN_FONT_SIZE
+    assert block.text.endswith("…")
+    assert _fits(block.text, DEFAULT_FAMILY, MIN_FONT_SIZE, box)
+
+
+@pytest.mark.parametrize("label", list(FORMATS))
+def test_layout_text_stays_inside_its_box(label):
+    layout = compute_layout(FORMATS[label], {
+        "headline": "SUMMER SALE - 50% OFF",
+        "subhead": "Clubcard members save even more",
+        "value_tile": "Clubcard Price",
+        "tag": "Available at Tesco",
+    })
+    for block in layout.blocks.values():
+        assert block.font_size >= MIN_FONT_SIZE
+        assert block.bbox.width <= block.box.width
+        assert block.bbox.height <= block.box.height
+        assert layout.frame.safe_zone.contains(block.box)